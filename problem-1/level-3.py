@@ -12,8 +12,11 @@ import csv
 import json
 import time
 import random
+import asyncio
 import logging
 import argparse
+import threading
+from collections import deque
 from datetime import datetime
 from urllib.parse import urlparse
 import requests
@@ -29,6 +32,13 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from fake_useragent import UserAgent
 
+# Optional import for browserless concurrent fetching
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -57,6 +67,62 @@ USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15',
 ]
 
+# Proxy circuit breaker settings
+PROXY_FAILURE_THRESHOLD = 3  # Consecutive failures before a proxy is taken out of rotation
+PROXY_RECHECK_INTERVAL = 60  # Seconds between giving failed proxies another chance
+
+# Page content that indicates a CAPTCHA or bot check
+CAPTCHA_INDICATORS = [
+    # Text indicators
+    "captcha", "robot", "verify you're human", "verify your identity", 
+    "security check", "prove you're not a robot", "verify your browser",
+    # Element IDs and classes
+    "g-recaptcha", "recaptcha", "captcha-container", "bot-check",
+    # Images
+    "captcha.jpg", "captcha.png", "recaptcha_logo", "captcha_challenge"
+]
+
+# Bot-check markers for static HTML. The text phrases are matched against the
+# visible page text only, since raw markup is full of false positives such as
+# <meta name="robots">, and bare "robot" would reject robot vacuums and toys.
+STATIC_CAPTCHA_TEXT = [
+    "captcha", "verify you're human", "verify your identity",
+    "security check", "prove you're not a robot", "verify your browser"
+]
+STATIC_CAPTCHA_SELECTOR = (
+    ".g-recaptcha, #captcha-container, .captcha-container, #bot-check, "
+    "iframe[src*='recaptcha'], img[src*='captcha']"
+)
+
+# Responses meaning the retailer is blocking the proxy rather than the page being missing
+PROXY_BLOCKED_STATUSES = (403, 429)
+
+# CSS selectors for extracting product data from static HTML (no browser)
+STATIC_SELECTORS = {
+    "walmart.com": {
+        "retailer": "Walmart",
+        "name": ["h1", ".prod-ProductTitle"],
+        "price": [
+            ".price-characteristic",
+            "[data-automation-id='price-characteristic']",
+            ".prod-PriceCharacteristic",
+            ".price-group",
+            "[itemprop='price']"
+        ]
+    },
+    "bestbuy.com": {
+        "retailer": "BestBuy",
+        "name": [".sku-title h1", "h1", ".heading-5", "[data-track='product-title']"],
+        "price": [
+            ".priceView-customer-price span",
+            ".priceView-hero-price span",
+            ".priceView-purchase-price",
+            "[data-track='price']",
+            ".pricing-price__regular-price"
+        ]
+    }
+}
+
 class StealthPriceTracker:
     """Tracks product prices while bypassing CAPTCHA and anti-bot measures."""
     
@@ -78,6 +144,14 @@ class StealthPriceTracker:
         self.captcha_encounters = 0
         self.successful_bypasses = 0
         
+        # Round-robin proxy pool with per-proxy circuit breaker state
+        self._proxy_pool = deque(self.proxy_list)
+        self._proxy_stats = {proxy: {'failures': 0, 'state': 'CLOSED'} for proxy in self.proxy_list}
+        self._proxy_lock = threading.Lock()
+        self._proxy_recheck_stop = threading.Event()
+        if self.use_proxy and self.proxy_list:
+            threading.Thread(target=self._proxy_recheck_loop, daemon=True).start()
+        
         # CSV headers for price records
         self.csv_headers = [
             "product_url", "product_name", "price", "currency", 
@@ -105,11 +179,48 @@ class StealthPriceTracker:
             # Fall back to our predefined list
             return random.choice(USER_AGENTS)
     
-    def _get_random_proxy(self):
-        """Get a random proxy from the proxy list if available."""
-        if not self.use_proxy or not self.proxy_list:
+    def _next_proxy(self):
+        """Get the next usable proxy from the pool, skipping proxies whose circuit is open."""
+        if not self.use_proxy or not self._proxy_pool:
             return None
-        return random.choice(self.proxy_list)
+        
+        with self._proxy_lock:
+            for _ in range(len(self._proxy_pool)):
+                proxy = self._proxy_pool[0]
+                self._proxy_pool.rotate(-1)
+                if self._proxy_stats[proxy]['state'] != 'OPEN':
+                    return proxy
+        
+        logger.warning("All proxies are currently failing, connecting without a proxy")
+        return None
+    
+    def _record_proxy_result(self, proxy, success):
+        """Update the circuit breaker state of a proxy after a request."""
+        if not proxy or proxy not in self._proxy_stats:
+            return
+        
+        with self._proxy_lock:
+            stats = self._proxy_stats[proxy]
+            if success:
+                stats['failures'] = 0
+                stats['state'] = 'CLOSED'
+                return
+            
+            stats['failures'] += 1
+            # A failed trial request re-opens the circuit immediately
+            if stats['state'] == 'HALF_OPEN' or stats['failures'] >= PROXY_FAILURE_THRESHOLD:
+                if stats['state'] != 'OPEN':
+                    logger.warning(f"Proxy {proxy} failed {stats['failures']} times, taking it out of rotation")
+                stats['state'] = 'OPEN'
+    
+    def _proxy_recheck_loop(self):
+        """Periodically move open proxies to half-open so they get a trial request."""
+        while not self._proxy_recheck_stop.wait(PROXY_RECHECK_INTERVAL):
+            with self._proxy_lock:
+                for proxy, stats in self._proxy_stats.items():
+                    if stats['state'] == 'OPEN':
+                        stats['state'] = 'HALF_OPEN'
+                        logger.debug(f"Proxy {proxy} is half-open, allowing a trial request")
     
     def _init_driver(self, retry=0):
         """Initialize the undetected ChromeDriver with stealth settings."""
@@ -136,7 +247,7 @@ class StealthPriceTracker:
             
             # Configure proxy if needed
             if self.use_proxy and self.proxy_list:
-                self.current_proxy = self._get_random_proxy()
+                self.current_proxy = self._next_proxy()
                 if self.current_proxy:
                     options.add_argument(f'--proxy-server={self.current_proxy}')
                     logger.debug(f"Using proxy: {self.current_proxy}")
@@ -179,6 +290,7 @@ class StealthPriceTracker:
         
         except Exception as e:
             logger.error(f"Error initializing driver: {e}")
+            self._record_proxy_result(self.current_proxy, False)
             time.sleep(2 + random.random() * 3)  # Random delay before retry
             return self._init_driver(retry + 1)
     
@@ -253,21 +365,11 @@ class StealthPriceTracker:
     
     def _is_captcha_present(self):
         """Check if a CAPTCHA is present on the current page."""
-        captcha_indicators = [
-            # Text indicators
-            "captcha", "robot", "verify you're human", "verify your identity", 
-            "security check", "prove you're not a robot", "verify your browser",
-            # Element IDs and classes
-            "g-recaptcha", "recaptcha", "captcha-container", "bot-check",
-            # Images
-            "captcha.jpg", "captcha.png", "recaptcha_logo", "captcha_challenge"
-        ]
-        
         try:
             # Check page source for captcha indicators
             page_source = self.driver.page_source.lower()
-            for indicator in captcha_indicators:
-                if indicator.lower() in page_source:
+            for indicator in CAPTCHA_INDICATORS:
+                if indicator in page_source:
                     return True
             
             # Check for reCAPTCHA iframe
@@ -404,6 +506,7 @@ class StealthPriceTracker:
             # Navigate to the URL
             logger.info(f"Navigating to Walmart product: {product_url}")
             self.driver.get(product_url)
+            self._record_proxy_result(self.current_proxy, True)
             
             # Random initial delay to mimic page load time observation
             self._human_delay(2, 5)
@@ -479,6 +582,7 @@ class StealthPriceTracker:
         
         except TimeoutException:
             logger.error(f"Timeout while accessing {product_url}")
+            self._record_proxy_result(self.current_proxy, False)
             if retry_count < max_retries - 1:
                 logger.info(f"Retrying (attempt {retry_count+1}/{max_retries})")
                 if self.driver:
@@ -490,6 +594,7 @@ class StealthPriceTracker:
         
         except WebDriverException as e:
             logger.error(f"WebDriver error: {e}")
+            self._record_proxy_result(self.current_proxy, False)
             if retry_count < max_retries - 1:
                 logger.info(f"Retrying (attempt {retry_count+1}/{max_retries})")
                 if self.driver:
@@ -540,6 +645,7 @@ class StealthPriceTracker:
             # Navigate to the URL
             logger.info(f"Navigating to Best Buy product: {product_url}")
             self.driver.get(product_url)
+            self._record_proxy_result(self.current_proxy, True)
             
             # Random initial delay to mimic page load time observation
             self._human_delay(2, 5)
@@ -613,6 +719,7 @@ class StealthPriceTracker:
         
         except TimeoutException:
             logger.error(f"Timeout while accessing {product_url}")
+            self._record_proxy_result(self.current_proxy, False)
             if retry_count < max_retries - 1:
                 logger.info(f"Retrying (attempt {retry_count+1}/{max_retries})")
                 if self.driver:
@@ -624,6 +731,7 @@ class StealthPriceTracker:
         
         except WebDriverException as e:
             logger.error(f"WebDriver error: {e}")
+            self._record_proxy_result(self.current_proxy, False)
             if retry_count < max_retries - 1:
                 logger.info(f"Retrying (attempt {retry_count+1}/{max_retries})")
                 if self.driver:
@@ -637,6 +745,119 @@ class StealthPriceTracker:
             logger.error(f"Error extracting data from Best Buy: {e}")
             return result
     
+    async def _fast_fetch(self, session, product_url):
+        """Fetch a product page without a browser. Returns the HTML or None on failure."""
+        headers = {
+            'User-Agent': self._get_random_user_agent(),
+            'Accept-Language': 'en-US,en;q=0.9'
+        }
+        
+        proxy = self._next_proxy()
+        if proxy and '://' not in proxy:
+            proxy_url = f"http://{proxy}"
+        else:
+            proxy_url = proxy
+        
+        try:
+            async with session.get(product_url, headers=headers, proxy=proxy_url) as response:
+                self._record_proxy_result(proxy, response.status not in PROXY_BLOCKED_STATUSES)
+                if response.status != 200:
+                    logger.debug(f"Fast fetch returned status {response.status} for {product_url}")
+                    return None
+                return await response.text()
+        except Exception as e:
+            logger.debug(f"Fast fetch failed for {product_url}: {e}")
+            self._record_proxy_result(proxy, False)
+            return None
+    
+    async def _fast_fetch_all(self, product_urls):
+        """Fetch all product pages concurrently over a shared HTTP session."""
+        connector = aiohttp.TCPConnector(limit=20)
+        timeout = aiohttp.ClientTimeout(total=20)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return await asyncio.gather(*[self._fast_fetch(session, url) for url in product_urls])
+    
+    def _extract_from_static_html(self, product_url, html):
+        """
+        Extract product information from static HTML.
+        
+        Returns None if the page is JS-rendered, CAPTCHA-protected or otherwise
+        lacks the expected selectors, meaning it has to go through the browser.
+        """
+        if not html:
+            return None
+        
+        domain = urlparse(product_url).netloc.lower()
+        selectors = None
+        for site, site_selectors in STATIC_SELECTORS.items():
+            if site in domain:
+                selectors = site_selectors
+                break
+        
+        if not selectors:
+            return None
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Bot checks need the full browser-based bypass
+        if soup.select_one(STATIC_CAPTCHA_SELECTOR):
+            return None
+        for tag in soup(["script", "style", "noscript", "template"]):
+            tag.decompose()
+        visible_text = soup.get_text(" ", strip=True).lower()
+        if any(indicator in visible_text for indicator in STATIC_CAPTCHA_TEXT):
+            return None
+        
+        product_name = None
+        for selector in selectors["name"]:
+            elem = soup.select_one(selector)
+            if elem and elem.get_text(strip=True):
+                product_name = elem.get_text(strip=True)
+                break
+        
+        price = None
+        for selector in selectors["price"]:
+            elem = soup.select_one(selector)
+            if elem:
+                price_text = elem.get_text(strip=True) or elem.get("content")
+                if price_text:
+                    price = self._clean_price(price_text)
+                    break
+        
+        if not product_name or not price:
+            return None
+        
+        return {
+            "product_url": product_url,
+            "product_name": product_name,
+            "price": price,
+            "currency": "USD",
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "retailer": selectors["retailer"],
+            "status": "success",
+            "captcha_encountered": False
+        }
+    
+    def _fetch_static_results(self, product_urls):
+        """Try to extract all products without a browser. Returns {url: result} for the pages that worked."""
+        if not AIOHTTP_AVAILABLE:
+            return {}
+        
+        try:
+            htmls = asyncio.run(self._fast_fetch_all(product_urls))
+        except Exception as e:
+            logger.debug(f"Concurrent fast fetch failed: {e}")
+            return {}
+        
+        results = {}
+        for url, html in zip(product_urls, htmls):
+            result = self._extract_from_static_html(url, html)
+            if result:
+                results[url] = result
+        
+        logger.info(f"Extracted {len(results)}/{len(product_urls)} products without a browser")
+        return results
+    
     def extract_product_info(self, product_url):
         """Extract product information based on the URL's domain."""
         domain = urlparse(product_url).netloc.lower()
@@ -680,10 +901,16 @@ class StealthPriceTracker:
             while True:
                 start_time = time.time()
                 
+                # Fetch static pages concurrently; only the rest need the browser
+                static_results = self._fetch_static_results(product_urls)
+                
                 for url in product_urls:
                     try:
                         # Extract product information
-                        result = self.extract_product_info(url)
+                        result = static_results.get(url)
+                        used_browser = result is None
+                        if used_browser:
+                            result = self.extract_product_info(url)
                         
                         # Save result to CSV
                         self.save_result_to_csv(result)
@@ -694,8 +921,9 @@ class StealthPriceTracker:
                         else:
                             logger.warning(f"Failed to extract data for {result['retailer']} product at {url}")
                         
-                        # Add variable delay between products
-                        self._human_delay(20, 45)
+                        # Add variable delay between browser visits
+                        if used_browser:
+                            self._human_delay(20, 45)
                     
                     except Exception as e:
                         logger.error(f"Error processing {url}: {e}")
@@ -727,6 +955,7 @@ class StealthPriceTracker:
     
     def close(self):
         """Close the browser and clean up resources."""
+        self._proxy_recheck_stop.set()
         if self.driver:
             self.driver.quit()
             self.driver = None
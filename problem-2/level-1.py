@@ -9,6 +9,7 @@ extracts key information, and outputs to CSV format.
 import os
 import csv
 import re
+import html
 import argparse
 from datetime import datetime
 from pathlib import Path
@@ -24,13 +25,47 @@ try:
     import numpy as np
     import email
     import imaplib
-    import xml.etree.ElementTree as ET
+    from lxml import etree as ET
 except ImportError as e:
     print(f"Error: Required library not installed: {e}")
     print("Please install required libraries using:")
-    print("pip install pytesseract pillow pdf2image PyPDF2 pandas opencv-python-headless numpy")
+    print("pip install pytesseract pillow pdf2image PyPDF2 pandas opencv-python-headless numpy lxml")
     exit(1)
 
+# Optional in-process OCR bindings (avoids pytesseract's temp-file round trip)
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+# Date formats tried when standardizing invoice dates
+DATE_FORMATS = (
+    '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
+    '%d/%m/%y', '%m/%d/%y', '%d-%m-%y', '%m-%d-%y',
+    '%d %b %Y', '%d %B %Y', '%b %d %Y', '%B %d %Y'
+)
+
+# Matches HTML tags in email bodies
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# XML parser: drop whitespace-only nodes and never expand external entities
+XML_PARSER = ET.XMLParser(remove_blank_text=True, resolve_entities=False, huge_tree=False)
+
+# Compiled XPath queries for XML invoice fields, in priority order
+XML_FIELD_XPATHS = {
+    field: tuple(ET.XPath(f"{path}/text()") for path in paths)
+    for field, paths in {
+        'vendor_name': ('.//vendor/name', './/supplier/name'),
+        'bill_number': ('.//invoice/number', './/invoiceNumber'),
+        'billing_date': ('.//invoice/date', './/invoiceDate'),
+        'due_date': ('.//invoice/dueDate', './/paymentDueDate'),
+        'total_amount': ('.//invoice/totalAmount', './/totalAmount')
+    }.items()
+}
+XML_LINE_ITEM_XPATHS = (ET.XPath('.//lineItem'), ET.XPath('.//item'))
+XML_LINE_ITEM_TEXT_XPATHS = (ET.XPath('./description/text()'), ET.XPath('./name/text()'))
+
 class InvoiceProcessor:
     """Main class for processing invoices from various sources."""
     
@@ -42,6 +77,19 @@ class InvoiceProcessor:
         
         # Ensure output directory exists
         os.makedirs(os.path.dirname(self.output_file) if os.path.dirname(self.output_file) else '.', exist_ok=True)
+        
+        # Map file extensions to their handlers
+        self._dispatch = {
+            ext: handler
+            for handler, extensions in [
+                (self._process_pdf, ['.pdf']),
+                (self._process_image, ['.jpg', '.jpeg', '.png', '.tiff', '.tif']),
+                (self._process_email, ['.eml']),
+                (self._process_xml, ['.xml']),
+                (self._process_csv, ['.csv'])
+            ]
+            for ext in extensions
+        }
     
     def process_all(self):
         """Process all files in the input directory."""
@@ -51,27 +99,18 @@ class InvoiceProcessor:
         
         # Process each file in the input directory
         files_processed = 0
-        for file_path in self.input_dir.glob('**/*'):
-            if file_path.is_file():
-                extension = file_path.suffix.lower()
-                try:
-                    if extension in ['.pdf']:
-                        self._process_pdf(file_path)
-                    elif extension in ['.jpg', '.jpeg', '.png', '.tiff', '.tif']:
-                        self._process_image(file_path)
-                    elif extension in ['.eml']:
-                        self._process_email(file_path)
-                    elif extension in ['.xml']:
-                        self._process_xml(file_path)
-                    elif extension in ['.csv']:
-                        self._process_csv(file_path)
-                    else:
-                        print(f"Skipping unsupported file: {file_path}")
-                        continue
-                    
-                    files_processed += 1
-                except Exception as e:
-                    print(f"Error processing {file_path}: {str(e)}")
+        for entry in self._walk_files(self.input_dir):
+            file_path = Path(entry.path)
+            handler = self._dispatch.get(os.path.splitext(entry.name)[1].lower())
+            if handler is None:
+                print(f"Skipping unsupported file: {file_path}")
+                continue
+            
+            try:
+                handler(file_path)
+                files_processed += 1
+            except Exception as e:
+                print(f"Error processing {file_path}: {str(e)}")
         
         print(f"Processed {files_processed} files.")
         
@@ -83,6 +122,15 @@ class InvoiceProcessor:
             print("No valid invoice data was extracted.")
             return False
     
+    def _walk_files(self, root):
+        """Recursively yield directory entries for all files under root."""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk_files(entry.path)
+                elif entry.is_file():
+                    yield entry
+    
     def _process_pdf(self, file_path):
         """Process PDF files (both text-based and scanned)."""
         print(f"Processing PDF: {file_path}")
@@ -103,13 +151,9 @@ class InvoiceProcessor:
         # If text extraction failed or returned little text, try OCR
         if len(extracted_text.strip()) < 100:  # Arbitrary threshold
             try:
-                # Convert PDF to images
+                # Convert PDF to images and perform OCR on each page
                 images = pdf2image.convert_from_path(file_path)
-                extracted_text = ""
-                for i, image in enumerate(images):
-                    # Perform OCR on each page
-                    page_text = pytesseract.image_to_string(image)
-                    extracted_text += page_text
+                extracted_text = self._ocr_images(images)
             except Exception as e:
                 print(f"Error performing OCR on PDF: {str(e)}")
         
@@ -119,6 +163,21 @@ class InvoiceProcessor:
             if invoice_data:
                 self.results.append(invoice_data)
     
+    def _ocr_images(self, images):
+        """Run OCR on a list of PIL images and return the combined text."""
+        if TESSEROCR_AVAILABLE:
+            # One API instance for all pages keeps the language model loaded
+            # and passes the pixels in memory instead of through a PNG file
+            with PyTessBaseAPI(psm=PSM.AUTO) as api:
+                text = ""
+                for image in images:
+                    api.SetImage(image)
+                    text += api.GetUTF8Text()
+                return text
+        
+        # Grayscale shrinks the image pytesseract has to encode for the CLI
+        return "".join(pytesseract.image_to_string(np.asarray(image.convert('L'))) for image in images)
+    
     def _process_image(self, file_path):
         """Process image files using OCR."""
         print(f"Processing image: {file_path}")
@@ -141,7 +200,7 @@ class InvoiceProcessor:
             preprocessed_image = Image.fromarray(thresh)
             
             # Perform OCR
-            extracted_text = pytesseract.image_to_string(preprocessed_image)
+            extracted_text = self._ocr_images([preprocessed_image])
             
             # Extract invoice data from the text
             if extracted_text:
@@ -160,18 +219,29 @@ class InvoiceProcessor:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as email_file:
                 msg = email.message_from_file(email_file)
             
-            # Process email body
-            email_body = ""
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    if content_type == "text/plain" or content_type == "text/html":
-                        try:
-                            email_body += part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        except:
-                            pass
-            else:
-                email_body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
+            # Walk the message once, collecting body text and attachment names
+            is_multipart = msg.is_multipart()
+            body_parts = []
+            attachments = []
+            for part in (msg.walk() if is_multipart else [msg]):
+                if part.get_content_maintype() == 'multipart':
+                    continue
+                
+                content_type = part.get_content_type()
+                if content_type in ("text/plain", "text/html") or not is_multipart:
+                    try:
+                        text = (part.get_payload(decode=True) or b"").decode('utf-8', errors='ignore')
+                    except:
+                        text = ""
+                    # Strip markup so the invoice patterns only see the text
+                    if content_type == "text/html":
+                        text = html.unescape(HTML_TAG_PATTERN.sub('\n', text))
+                    body_parts.append(text)
+                
+                if part.get('Content-Disposition') is not None and part.get_filename():
+                    attachments.append(part.get_filename())
+            
+            email_body = "".join(body_parts)
             
             # Extract invoice data from email body
             if email_body:
@@ -180,16 +250,9 @@ class InvoiceProcessor:
                     self.results.append(invoice_data)
             
             # Process attachments (simplified - in a real system, save and process them)
-            for part in msg.walk():
-                if part.get_content_maintype() == 'multipart':
-                    continue
-                if part.get('Content-Disposition') is None:
-                    continue
-                
-                filename = part.get_filename()
-                if filename:
-                    print(f"Email contains attachment: {filename}")
-                    # In a real system, save and process the attachment based on its type
+            for filename in attachments:
+                print(f"Email contains attachment: {filename}")
+                # In a real system, save and process the attachment based on its type
         except Exception as e:
             print(f"Error processing email file: {str(e)}")
     
@@ -198,19 +261,16 @@ class InvoiceProcessor:
         print(f"Processing XML: {file_path}")
         
         try:
-            tree = ET.parse(file_path)
+            tree = ET.parse(str(file_path), XML_PARSER)
             root = tree.getroot()
             
             # XML structure varies by format, this is a simplified example
             invoice_data = {
-                'vendor_name': self._safe_xml_extract(root, './/vendor/name') or self._safe_xml_extract(root, './/supplier/name'),
-                'bill_number': self._safe_xml_extract(root, './/invoice/number') or self._safe_xml_extract(root, './/invoiceNumber'),
-                'billing_date': self._safe_xml_extract(root, './/invoice/date') or self._safe_xml_extract(root, './/invoiceDate'),
-                'due_date': self._safe_xml_extract(root, './/invoice/dueDate') or self._safe_xml_extract(root, './/paymentDueDate'),
-                'total_amount': self._safe_xml_extract(root, './/invoice/totalAmount') or self._safe_xml_extract(root, './/totalAmount'),
-                'line_items': self._extract_xml_line_items(root),
-                'source_file': str(file_path)
+                field: self._safe_xml_extract(root, xpaths)
+                for field, xpaths in XML_FIELD_XPATHS.items()
             }
+            invoice_data['line_items'] = self._extract_xml_line_items(root)
+            invoice_data['source_file'] = str(file_path)
             
             # Validate and clean data
             invoice_data = self._validate_and_clean_data(invoice_data)
@@ -219,13 +279,16 @@ class InvoiceProcessor:
         except Exception as e:
             print(f"Error processing XML file: {str(e)}")
     
-    def _safe_xml_extract(self, root, xpath):
-        """Safely extract XML elements that might not exist."""
-        try:
-            element = root.find(xpath)
-            return element.text.strip() if element is not None and element.text else ""
-        except:
-            return ""
+    def _safe_xml_extract(self, root, xpaths):
+        """Return the text of the first compiled XPath that matches, or an empty string."""
+        for xpath in xpaths:
+            try:
+                texts = xpath(root)
+            except ET.XPathError:
+                continue
+            if texts and texts[0].strip():
+                return texts[0].strip()
+        return ""
     
     def _extract_xml_line_items(self, root):
         """Extract line items from XML structure."""
@@ -233,9 +296,9 @@ class InvoiceProcessor:
         
         # XML structure varies by format, this is a simplified example
         try:
-            for item in root.findall('.//lineItem') or root.findall('.//item'):
-                description = self._safe_xml_extract(item, './description') or self._safe_xml_extract(item, './name')
-                line_items.append(description)
+            items = XML_LINE_ITEM_XPATHS[0](root) or XML_LINE_ITEM_XPATHS[1](root)
+            for item in items:
+                line_items.append(self._safe_xml_extract(item, XML_LINE_ITEM_TEXT_XPATHS))
         except:
             pass
             
@@ -253,11 +316,11 @@ class InvoiceProcessor:
             if 'vendor_name' in df.columns or 'supplier' in df.columns:
                 # This appears to be a properly formatted invoice
                 invoice_data = {
-                    'vendor_name': df.get('vendor_name', df.get('supplier', [""]))[0],
-                    'bill_number': df.get('invoice_number', df.get('bill_number', [""]))[0],
-                    'billing_date': df.get('invoice_date', df.get('billing_date', [""]))[0],
-                    'due_date': df.get('due_date', [""])[0],
-                    'total_amount': df.get('total_amount', df.get('amount', [""]))[0],
+                    'vendor_name': self._first_csv_value(df, 'vendor_name', 'supplier'),
+                    'bill_number': self._first_csv_value(df, 'invoice_number', 'bill_number'),
+                    'billing_date': self._first_csv_value(df, 'invoice_date', 'billing_date'),
+                    'due_date': self._first_csv_value(df, 'due_date'),
+                    'total_amount': self._first_csv_value(df, 'total_amount', 'amount'),
                     'line_items': self._extract_csv_line_items(df),
                     'source_file': str(file_path)
                 }
@@ -269,17 +332,24 @@ class InvoiceProcessor:
         except Exception as e:
             print(f"Error processing CSV file: {str(e)}")
     
+    def _first_csv_value(self, df, *columns):
+        """Return the first-row value of the first column present, or an empty string."""
+        for column in columns:
+            if column in df.columns:
+                return df[column].iat[0]
+        return ""
+    
     def _extract_csv_line_items(self, df):
         """Extract line items from CSV data."""
-        line_items = []
-        
         # If there's a description or item column, extract those
         if 'description' in df.columns:
-            line_items = df['description'].dropna().tolist()
+            column = 'description'
         elif 'item' in df.columns:
-            line_items = df['item'].dropna().tolist()
+            column = 'item'
+        else:
+            return ""
         
-        return "; ".join(str(item) for item in line_items) if line_items else ""
+        return df[column].dropna().astype(str).str.cat(sep='; ')
     
     def _extract_invoice_data(self, text, file_path):
         """Extract invoice data from text using regular expressions."""
@@ -380,41 +450,9 @@ class InvoiceProcessor:
             invoice_data['bill_number'] = re.sub(r'\s+', '', invoice_data['bill_number']).strip()
         
         # Clean and standardize dates
-        if invoice_data['billing_date']:
-            try:
-                # Try to parse and standardize the date format
-                date_formats = [
-                    '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
-                    '%d/%m/%y', '%m/%d/%y', '%d-%m-%y', '%m-%d-%y',
-                    '%d %b %Y', '%d %B %Y', '%b %d %Y', '%B %d %Y'
-                ]
-                for date_format in date_formats:
-                    try:
-                        parsed_date = datetime.strptime(invoice_data['billing_date'], date_format)
-                        invoice_data['billing_date'] = parsed_date.strftime('%Y-%m-%d')
-                        break
-                    except ValueError:
-                        continue
-            except:
-                pass  # Keep original if parsing fails
-        
-        if invoice_data['due_date']:
-            try:
-                # Try to parse and standardize the date format
-                date_formats = [
-                    '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
-                    '%d/%m/%y', '%m/%d/%y', '%d-%m-%y', '%m-%d-%y',
-                    '%d %b %Y', '%d %B %Y', '%b %d %Y', '%B %d %Y'
-                ]
-                for date_format in date_formats:
-                    try:
-                        parsed_date = datetime.strptime(invoice_data['due_date'], date_format)
-                        invoice_data['due_date'] = parsed_date.strftime('%Y-%m-%d')
-                        break
-                    except ValueError:
-                        continue
-            except:
-                pass  # Keep original if parsing fails
+        for date_field in ('billing_date', 'due_date'):
+            if invoice_data[date_field]:
+                invoice_data[date_field] = self._normalize_date(invoice_data[date_field])
         
         # Clean total amount
         if invoice_data['total_amount']:
@@ -429,6 +467,15 @@ class InvoiceProcessor:
         
         return invoice_data
     
+    def _normalize_date(self, date_str):
+        """Convert a date string to YYYY-MM-DD, keeping the original if no format matches."""
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(date_str, date_format).strftime('%Y-%m-%d')
+            except (ValueError, TypeError):
+                continue
+        return date_str
+    
     def _is_valid_invoice(self, invoice_data):
         """Check if the extracted invoice data is valid enough to be included."""
         # At minimum, we need either a vendor name or a bill number,
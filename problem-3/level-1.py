@@ -8,6 +8,47 @@ import argparse
 import librosa
 import numpy as np
 import os
+from numba import njit
+
+# Sample rate used for analysis; higher source rates are resampled on load
+SAMPLE_RATE = 22050
+
+@njit(cache=True, fastmath=True)
+def _pick_peaks(env, pre_max, post_max, pre_avg, post_avg, delta, wait):
+    """
+    Compiled equivalent of librosa.util.peak_pick.
+    
+    A frame is a peak if it is the maximum of env[i - pre_max:i + post_max],
+    is at least delta above the mean of env[i - pre_avg:i + post_avg], and
+    comes more than `wait` frames after the previous peak.
+    
+    Returns:
+        np.ndarray: Frame indices of the detected peaks
+    """
+    n = env.shape[0]
+    peaks = np.empty(n, dtype=np.int64)
+    count = 0
+    last = -wait - 1
+    
+    for i in range(n):
+        lo = max(0, i - pre_max)
+        hi = min(n, i + post_max)
+        if env[i] != env[lo:hi].max():
+            continue
+        
+        avg_lo = max(0, i - pre_avg)
+        avg_hi = min(n, i + post_avg)
+        if env[i] < env[avg_lo:avg_hi].mean() + delta:
+            continue
+        
+        if i - last <= wait:
+            continue
+        
+        peaks[count] = i
+        count += 1
+        last = i
+    
+    return peaks[:count]
 
 def detect_beats(audio_file, sensitivity=1.1):
     """
@@ -20,27 +61,27 @@ def detect_beats(audio_file, sensitivity=1.1):
     Returns:
         list: Timestamps (in seconds) where beats occur
     """
-    # Load audio file
-    y, sr = librosa.load(audio_file, sr=None)
+    # Load audio file, resampled to a fixed rate (beat detection needs nothing above ~11 kHz)
+    y, sr = librosa.load(audio_file, sr=SAMPLE_RATE, mono=True, res_type='soxr_mq', dtype=np.float32)
     
-    # Compute onset envelope using RMS energy
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    # Compute onset envelope using RMS energy (kept in float32; no precision is needed beyond that)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr).astype(np.float32, copy=False)
     
     # Set dynamic threshold based on the median of the onset envelope
     threshold = np.median(onset_env) * sensitivity
     
     # Apply a minimum threshold for silent sections
     min_threshold = np.max(onset_env) * 0.05
-    effective_threshold = max(threshold, min_threshold)
+    effective_threshold = np.float32(max(threshold, min_threshold))
     
     # Find peaks in onset envelope (beats)
-    peaks = librosa.util.peak_pick(onset_env, 
-                                   pre_max=3, 
-                                   post_max=3, 
-                                   pre_avg=3, 
-                                   post_avg=5, 
-                                   delta=effective_threshold, 
-                                   wait=10)
+    peaks = _pick_peaks(onset_env, 
+                        pre_max=3, 
+                        post_max=3, 
+                        pre_avg=3, 
+                        post_avg=5, 
+                        delta=effective_threshold, 
+                        wait=10)
     
     # Convert frame indices to timestamps (seconds)
     timestamps = librosa.frames_to_time(peaks, sr=sr)
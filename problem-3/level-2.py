@@ -6,11 +6,20 @@ with support for customizable parameters.
 """
 
 import argparse
+import hashlib
 import librosa
 import numpy as np
+import soundfile as sf
 import os
-import math
 from datetime import timedelta
+from numba import njit
+
+SAMPLE_RATE = 22050  # Analysis sample rate; beat-level cuts do not need the source rate
+HOP_LENGTH = 512  # Default hop length in librosa
+PEAK_WAIT = 10  # Frames that must pass after a peak before the next one
+FRAME_LENGTH = 2048  # Default frame length in librosa
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'cut-markers')
+FEATURE_CACHE_VERSION = 2  # Bump when the feature computation changes
 
 def format_timestamp(seconds):
     """
@@ -22,14 +31,189 @@ def format_timestamp(seconds):
     Returns:
         str: Formatted timestamp
     """
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds_remainder = seconds % 60
+    # Integer milliseconds avoid float carry errors (e.g. 59.9996s -> "00:00:60:000")
+    total_ms = int(round(seconds * 1000))
+    hours, remainder = divmod(total_ms, 3_600_000)
+    minutes, remainder = divmod(remainder, 60_000)
+    secs, ms = divmod(remainder, 1000)
     
-    # Format with milliseconds
-    return f"{hours:02d}:{minutes:02d}:{seconds_remainder:06.3f}".replace(".", ":")
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}:{ms:03d}"
 
-def detect_cut_markers(audio_file, sensitivity=1.1, min_gap=1.0, skip_silence=True, energy_threshold=0.05):
+@njit(cache=True)
+def _pick_peaks(env, pre_max, post_max, pre_avg, post_avg, delta, wait):
+    """
+    Compiled equivalent of librosa.util.peak_pick
+    
+    A frame is a peak if it is the maximum of env[i - pre_max:i + post_max],
+    is at least delta above the mean of env[i - pre_avg:i + post_avg], and
+    comes more than `wait` frames after the previous peak.
+    
+    Args:
+        env (np.ndarray): Onset envelope
+        pre_max, post_max (int): Frames before/after a peak in its local-maximum window
+        pre_avg, post_avg (int): Frames before/after a peak in its local-mean window
+        delta (float): Margin a peak must clear above the local mean
+        wait (int): Frames to skip after each peak
+        
+    Returns:
+        np.ndarray: Frame indices of the detected peaks
+    """
+    n = env.shape[0]
+    peaks = np.empty(n, dtype=np.int64)
+    count = 0
+    last = -wait - 1
+    
+    for i in range(n):
+        lo = max(0, i - pre_max)
+        hi = min(n, i + post_max)
+        if env[i] != env[lo:hi].max():
+            continue
+        
+        avg_lo = max(0, i - pre_avg)
+        avg_hi = min(n, i + post_avg)
+        if env[i] < env[avg_lo:avg_hi].mean() + delta:
+            continue
+        
+        if i - last <= wait:
+            continue
+        
+        peaks[count] = i
+        count += 1
+        last = i
+    
+    return peaks[:count]
+
+@njit(cache=True)
+def _filter_markers(timestamps, frames, rms_energy, energy_threshold, min_gap, skip_silence):
+    """
+    Drop low-energy markers and enforce the minimum gap in a single pass
+    
+    Args:
+        timestamps (np.ndarray): Sorted marker timestamps in seconds
+        frames (np.ndarray): Frame index of each marker
+        rms_energy (np.ndarray): Normalized RMS energy per frame
+        energy_threshold (float): Energy below which a marker is considered silent
+        min_gap (float): Minimum gap between kept markers in seconds
+        skip_silence (bool): Whether to drop markers in low-energy sections
+        
+    Returns:
+        np.ndarray: Timestamps of the kept markers
+    """
+    kept = np.empty(timestamps.size, dtype=np.float64)
+    n = 0
+    last = -np.inf
+    last_frame = rms_energy.size - 1
+    for i in range(timestamps.size):
+        if skip_silence and rms_energy[min(frames[i], last_frame)] < energy_threshold:
+            continue
+        if timestamps[i] - last < min_gap:
+            continue
+        kept[n] = timestamps[i]
+        n += 1
+        last = timestamps[i]
+    
+    return kept[:n]
+
+def _median_and_max(values):
+    """
+    Compute the median and maximum of a 1D array with a single partition
+    
+    Args:
+        values (np.ndarray): Non-empty 1D array
+        
+    Returns:
+        tuple: (median, maximum)
+    """
+    n = values.size
+    mid = n // 2
+    # One introselect places both middle elements and the maximum in their sorted positions
+    part = np.partition(values, (max(mid - 1, 0), mid, n - 1))
+    median = part[mid] if n % 2 else (part[mid - 1] + part[mid]) / 2
+    return median, part[-1]
+
+def load_audio(audio_file, sample_rate=SAMPLE_RATE):
+    """
+    Load an audio file as a mono float32 signal at the given sample rate
+    
+    WAV files are read directly with soundfile; other formats (e.g. MP3)
+    go through librosa's generic decoder.
+    
+    Args:
+        audio_file (str): Path to the audio file (.wav or .mp3)
+        sample_rate (int): Sample rate to resample to (None keeps the native rate)
+        
+    Returns:
+        tuple: (samples as np.ndarray, sample rate)
+    """
+    if os.path.splitext(audio_file)[1].lower() != '.wav':
+        return librosa.load(audio_file, sr=sample_rate, dtype=np.float32, res_type='soxr_mq')
+    
+    y, sr = sf.read(audio_file, dtype='float32', always_2d=False)
+    if y.ndim == 2:
+        y = y.mean(axis=1)
+    if sample_rate and sr != sample_rate:
+        y = librosa.resample(y, orig_sr=sr, target_sr=sample_rate, res_type='soxr_mq')
+        sr = sample_rate
+    return y, sr
+
+def _feature_cache_path(audio_file, cache_dir, sample_rate):
+    """Build the cache file path for an audio file from its path, mtime, size and analysis settings."""
+    stat = os.stat(audio_file)
+    key = f"{FEATURE_CACHE_VERSION}|{os.path.abspath(audio_file)}|{stat.st_mtime_ns}|{stat.st_size}|{sample_rate}|{HOP_LENGTH}|{FRAME_LENGTH}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz')
+
+def compute_features(audio_file, cache_dir=None, sample_rate=SAMPLE_RATE):
+    """
+    Compute the onset envelope and RMS energy of an audio file
+    
+    Results are cached on disk when cache_dir is given, so re-running with
+    different detection parameters skips loading and analysing the audio.
+    
+    Args:
+        audio_file (str): Path to the audio file (.wav or .mp3)
+        cache_dir (str): Directory for cached features (None disables caching)
+        sample_rate (int): Analysis sample rate (None keeps the native rate)
+        
+    Returns:
+        tuple: (onset envelope, RMS energy, sample rate)
+    """
+    cache_path = None
+    if cache_dir:
+        cache_path = _feature_cache_path(audio_file, cache_dir, sample_rate)
+        try:
+            with np.load(cache_path) as cached:
+                return cached['onset_env'], cached['rms_energy'], int(cached['sr'])
+        except Exception:
+            pass  # Missing or unreadable cache entry, recompute
+    
+    # Load audio file
+    y, sr = load_audio(audio_file, sample_rate)
+    
+    # Compute one magnitude spectrogram and derive both features from it
+    S = np.abs(librosa.stft(y, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH))
+    
+    # Compute onset envelope from the log-power mel spectrogram
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr,
+                                             hop_length=HOP_LENGTH).astype(np.float32, copy=False)
+    
+    # Compute RMS energy for each frame
+    rms_energy = librosa.feature.rms(S=S, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)[0].astype(np.float32, copy=False)
+    
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, onset_env=onset_env, rms_energy=rms_energy, sr=sr)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: Could not write feature cache: {e}")
+    
+    return onset_env, rms_energy, sr
+
+def detect_cut_markers(audio_file, sensitivity=1.1, min_gap=1.0, skip_silence=True, energy_threshold=0.05,
+                       cache_dir=None, sample_rate=SAMPLE_RATE):
     """
     Generate cut markers based on beat detection with advanced parameters
     
@@ -39,60 +223,41 @@ def detect_cut_markers(audio_file, sensitivity=1.1, min_gap=1.0, skip_silence=Tr
         min_gap (float): Minimum gap between cut markers in seconds
         skip_silence (bool): Whether to skip markers in low-energy sections
         energy_threshold (float): Relative energy threshold below which sections are considered silent
+        cache_dir (str): Directory for cached audio features (None disables caching)
+        sample_rate (int): Sample rate to analyse the audio at (None keeps the native rate)
         
     Returns:
         list: Timestamps (in seconds) for cut points
     """
-    # Load audio file
-    y, sr = librosa.load(audio_file, sr=None)
-    
-    # Compute onset envelope using RMS energy
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    
-    # Compute RMS energy for each frame
-    hop_length = 512  # Default hop length in librosa
-    frame_length = 2048  # Default frame length in librosa
-    rms_energy = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
+    # Compute (or load cached) onset envelope and RMS energy
+    onset_env, rms_energy, sr = compute_features(audio_file, cache_dir, sample_rate)
     
     # Normalize RMS energy
-    rms_energy = rms_energy / np.max(rms_energy) if np.max(rms_energy) > 0 else rms_energy
+    rms_max = rms_energy.max()
+    rms_energy = rms_energy / rms_max if rms_max > 0 else rms_energy
     
     # Set dynamic threshold based on the median of the onset envelope
-    threshold = np.median(onset_env) * sensitivity
+    onset_median, onset_max = _median_and_max(onset_env)
+    threshold = onset_median * sensitivity
     
     # Apply a minimum threshold for silent sections
-    min_threshold = np.max(onset_env) * 0.05
-    effective_threshold = max(threshold, min_threshold)
-    
-    # Find peaks in onset envelope (beats)
-    peaks = librosa.util.peak_pick(onset_env, 
-                                  pre_max=3, 
-                                  post_max=3, 
-                                  pre_avg=3, 
-                                  post_avg=5, 
-                                  delta=effective_threshold, 
-                                  wait=10)
+    min_threshold = onset_max * 0.05
+    effective_threshold = np.float32(max(threshold, min_threshold))
+    
+    # Find peaks in onset envelope (beats) that clear the local mean by the threshold
+    peaks = _pick_peaks(onset_env,
+                        pre_max=3,
+                        post_max=3,
+                        pre_avg=3,
+                        post_avg=5,
+                        delta=effective_threshold,
+                        wait=PEAK_WAIT)
     
     # Convert frame indices to timestamps (seconds)
-    cut_timestamps = librosa.frames_to_time(peaks, sr=sr)
-    
-    # Filter out markers in low-energy sections if requested
-    if skip_silence:
-        # Convert peaks to frame indices for energy lookup
-        energy_frames = [min(len(rms_energy)-1, math.floor(peak * sr / hop_length)) for peak in peaks]
-        # Filter out peaks with low energy
-        energy_mask = [rms_energy[frame] >= energy_threshold for frame in energy_frames]
-        cut_timestamps = cut_timestamps[energy_mask]
-    
-    # Apply minimum gap filtering
-    if cut_timestamps.size > 0:
-        filtered_timestamps = [cut_timestamps[0]]
-        
-        for i in range(1, len(cut_timestamps)):
-            if cut_timestamps[i] - filtered_timestamps[-1] >= min_gap:
-                filtered_timestamps.append(cut_timestamps[i])
-        
-        cut_timestamps = np.array(filtered_timestamps)
+    cut_timestamps = (peaks * HOP_LENGTH) / sr
+    
+    # Filter out markers in low-energy sections (if requested) and apply minimum gap filtering
+    cut_timestamps = _filter_markers(cut_timestamps, peaks, rms_energy, energy_threshold, min_gap, skip_silence)
     
     return cut_timestamps.tolist()
 
@@ -109,6 +274,12 @@ def main():
     parser.add_argument('--energy-threshold', type=float, default=0.05,
                         help='Energy threshold for silence detection (default: 0.05)')
     parser.add_argument('--output-file', help='Output file for markers (if not specified, prints to console)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'Directory for cached audio features (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_const', const=None, dest='cache_dir',
+                        help='Do not read or write cached audio features')
+    parser.add_argument('--sample-rate', type=int, default=SAMPLE_RATE,
+                        help=f'Sample rate to analyse the audio at, 0 for the native rate (default: {SAMPLE_RATE})')
     
     args = parser.parse_args()
     
@@ -130,7 +301,9 @@ def main():
             args.sensitivity, 
             args.min_gap, 
             args.skip_silence, 
-            args.energy_threshold
+            args.energy_threshold,
+            args.cache_dir,
+            args.sample_rate or None
         )
         
         # Format markers as HH:MM:SS.MS
@@ -6,6 +6,8 @@ Cross-platform support for Linux, macOS, and Windows.
 """
 
 import argparse
+import bisect
+import mmap
 import os
 import re
 import subprocess
@@ -14,7 +16,29 @@ import time
 import logging
 import ipaddress
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional RE2 engine for log scanning (linear-time DFA matching, no backtracking)
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+# Optional native journald reader (Linux)
+try:
+    from systemd import journal
+    SYSTEMD_AVAILABLE = True
+except ImportError:
+    SYSTEMD_AVAILABLE = False
+
+# Optional native Windows Event Log API (pywin32)
+try:
+    import win32evtlog
+    WIN32EVTLOG_AVAILABLE = True
+except ImportError:
+    WIN32EVTLOG_AVAILABLE = False
 
 # Configure logging
 logging.basicConfig(
@@ -28,6 +52,21 @@ logger = logging.getLogger(__name__)
 DEFAULT_THRESHOLD = 5  # Default number of failed attempts before blocking
 DEFAULT_TIME_WINDOW = 5  # Default time window in minutes to consider for failed attempts
 DEFAULT_BLOCK_DURATION = 60  # Default block duration in minutes
+IPSET_NAME = "sshdefender"  # Kernel IP set holding blocked addresses (Linux)
+
+# Failed SSH password patterns, compiled once (bytes patterns scan raw command output and mmapped log files)
+_regex = re2 if RE2_AVAILABLE else re
+SYSLOG_FAILED_PATTERN_BYTES = _regex.compile(rb"(\w+ +\d+ +\d+:\d+:\d+).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)")
+JOURNAL_MESSAGE_FAILED_PATTERN = _regex.compile(r"Failed password for .* from (\d+\.\d+\.\d+\.\d+)")
+JOURNAL_CURSOR_PATTERN_BYTES = re.compile(rb"^-- cursor: (.+)$", re.MULTILINE)
+MACOS_LOG_FAILED_PATTERN_BYTES = _regex.compile(rb"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)")
+SECURITY_LOGON_FAILED_EVENT_ID = 4625
+SECURITY_EVENT_IP_INDEX = 19  # IpAddress (Source Network Address) in the 4625 event inserts
+OPENSSH_FAILED_PATTERN_BYTES = _regex.compile(rb"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*Failed password for .* from (\d+\.\d+\.\d+\.\d+)")
+
+# Syslog month abbreviations, used to parse timestamps without strptime
+MONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+          'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
 
 class SSHDefender:
     """Main class for detecting and blocking SSH brute-force attacks."""
@@ -49,9 +88,19 @@ class SSHDefender:
         self.block_duration = block_duration
         self.whitelist = set()
         self.dry_run = dry_run
-        self.failed_attempts = defaultdict(list)
+        self.failed_attempts = defaultdict(deque)
         self.blocked_ips = set()
         
+        # Journal read position, so each poll only reads new entries
+        self._journal = None
+        self._journal_cursor = None
+        
+        # Scanned position per log file: path -> (inode, byte offset)
+        self._log_offsets = {}
+        
+        # Whether the ipset and its iptables rule have been set up
+        self._ipset_ready = False
+        
         # Add whitelisted IPs
         if whitelist:
             for ip in whitelist:
@@ -102,56 +151,155 @@ class SSHDefender:
             logger.error(f"Unsupported platform: {self.platform}")
             return []
     
-    def _get_failed_attempts_linux(self):
-        """Get failed SSH login attempts from Linux logs."""
-        attempts = []
+    def _scan_log_file(self, log_file, pattern):
+        """
+        Scan the new part of a log file for failed password attempts.
         
-        # Try using journalctl first (systemd-based systems)
-        try:
-            cmd = ["journalctl", "-u", "ssh", "-n", "1000", "--no-pager"]
-            output = subprocess.check_output(cmd, universal_newlines=True)
+        The file is memory-mapped and searched with a single finditer pass
+        starting where the previous scan stopped, so each poll only touches
+        newly written lines. Rotated or truncated files are rescanned from
+        the start.
+        
+        Args:
+            log_file (str): Path to the log file
+            pattern: Compiled bytes pattern (re or re2) capturing (timestamp, ip)
             
-            # Extract failed password attempts
-            pattern = r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)"
-            for line in output.splitlines():
-                match = re.search(pattern, line)
-                if match:
-                    try:
-                        timestamp_str = match.group(1)
-                        # Add year as journalctl might not include it
-                        if len(timestamp_str.split()) < 3:
-                            timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                        timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                        ip = match.group(2)
-                        attempts.append((timestamp, ip))
-                    except Exception as e:
-                        logger.debug(f"Error parsing timestamp: {e}")
-        except Exception as e:
-            logger.debug(f"Error using journalctl: {e}")
+        Returns:
+            list: (timestamp string, ip) tuples
+        """
+        with open(log_file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            inode, offset = self._log_offsets.get(log_file, (stat.st_ino, 0))
+            if inode != stat.st_ino or stat.st_size < offset:
+                offset = 0  # Log was rotated or truncated
+                self._log_offsets[log_file] = (stat.st_ino, 0)
+            if stat.st_size == offset:
+                return []  # Nothing new (also avoids mapping empty files)
+            
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    # Single forward pass: ask for aggressive readahead
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                # Stop at the last complete line; a partially written line is picked up next time
+                end = mm.rfind(b'\n', offset) + 1
+                if end <= offset:
+                    return []
+                self._log_offsets[log_file] = (stat.st_ino, end)
+                return self._find_attempts(pattern, mm, offset, end)
+    
+    def _scan_log_files(self, log_files, pattern):
+        """
+        Scan the existing files among log_files, in parallel when there are several.
         
-        # If journalctl failed or found no results, try auth.log
-        if not attempts:
+        Args:
+            log_files (list): Candidate log file paths
+            pattern: Compiled bytes pattern (re or re2) capturing (timestamp, ip)
+            
+        Returns:
+            list: Combined (timestamp string, ip) tuples from all files
+        """
+        log_files = [log_file for log_file in log_files if os.path.exists(log_file)]
+        if len(log_files) <= 1:
+            return [match for log_file in log_files for match in self._scan_log_file(log_file, pattern)]
+        
+        with ThreadPoolExecutor(max_workers=len(log_files)) as executor:
+            results = executor.map(lambda log_file: self._scan_log_file(log_file, pattern), log_files)
+            return [match for result in results for match in result]
+    
+    def _find_attempts(self, pattern, buffer, start=0, end=None):
+        """Return decoded (timestamp string, ip) tuples for every match of a bytes pattern in buffer[start:end]."""
+        if end is None:
+            end = len(buffer)
+        return [(match.group(1).decode('ascii'), match.group(2).decode('ascii'))
+                for match in pattern.finditer(buffer, start, end)]
+    
+    def _parse_syslog_attempts(self, matches):
+        """Convert (syslog timestamp, ip) tuples into (datetime, ip) attempts."""
+        attempts = []
+        # Syslog timestamps (e.g. "Jan  5 10:00:01") do not include the year
+        year = datetime.now().year
+        for timestamp_str, ip in matches:
+            try:
+                month, day, hms = timestamp_str.split()
+                hour, minute, second = hms.split(':')
+                timestamp = datetime(year, MONTHS[month], int(day), int(hour), int(minute), int(second))
+                attempts.append((timestamp, ip))
+            except Exception as e:
+                logger.debug(f"Error parsing timestamp: {e}")
+        return attempts
+    
+    def _parse_iso_attempts(self, matches):
+        """Convert (YYYY-MM-DD HH:MM:SS, ip) tuples into (datetime, ip) attempts."""
+        attempts = []
+        for timestamp_str, ip in matches:
             try:
-                log_files = ["/var/log/auth.log", "/var/log/secure"]
-                for log_file in log_files:
-                    if os.path.exists(log_file):
-                        with open(log_file, 'r') as f:
-                            for line in f:
-                                if "sshd" in line and "Failed password" in line:
-                                    match = re.search(r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)", line)
-                                    if match:
-                                        try:
-                                            timestamp_str = match.group(1)
-                                            # Add year as auth.log might not include it
-                                            if len(timestamp_str.split()) < 3:
-                                                timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                                            timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                                            ip = match.group(2)
-                                            attempts.append((timestamp, ip))
-                                        except Exception as e:
-                                            logger.debug(f"Error parsing timestamp: {e}")
+                # Collapse the date/time separator to a single space for fromisoformat
+                timestamp = datetime.fromisoformat(' '.join(timestamp_str.split()))
+                attempts.append((timestamp, ip))
             except Exception as e:
-                logger.debug(f"Error parsing auth.log: {e}")
+                logger.debug(f"Error parsing timestamp: {e}")
+        return attempts
+    
+    def _read_journal(self):
+        """
+        Read failed SSH attempts logged to journald since the previous poll.
+        
+        Uses the native systemd reader when available, otherwise journalctl
+        with --after-cursor. The first poll starts at the beginning of the
+        time window.
+        
+        Returns:
+            list: (datetime, ip) tuples
+        """
+        attempts = []
+        
+        if SYSTEMD_AVAILABLE:
+            if self._journal is None:
+                self._journal = journal.Reader()
+                self._journal.add_match(_SYSTEMD_UNIT='ssh.service')
+                self._journal.add_disjunction()
+                self._journal.add_match(_SYSTEMD_UNIT='sshd.service')
+                self._journal.seek_realtime(datetime.now() - timedelta(minutes=self.time_window))
+            else:
+                self._journal.process()  # Pick up entries written since the last poll
+            
+            for entry in self._journal:
+                message = entry.get('MESSAGE', '')
+                if 'Failed password' in message:
+                    match = JOURNAL_MESSAGE_FAILED_PATTERN.search(message)
+                    if match:
+                        attempts.append((entry['__REALTIME_TIMESTAMP'], match.group(1)))
+            return attempts
+        
+        cmd = ["journalctl", "-u", "ssh", "-u", "sshd", "--no-pager", "--show-cursor"]
+        if self._journal_cursor:
+            cmd += ["--after-cursor", self._journal_cursor]
+        else:
+            cmd += ["--since", f"-{self.time_window}min"]
+        output = subprocess.check_output(cmd)
+        
+        cursor = JOURNAL_CURSOR_PATTERN_BYTES.search(output)
+        if cursor:
+            self._journal_cursor = cursor.group(1).decode('ascii')
+        
+        # Extract failed password attempts from the raw output in one pass
+        return self._parse_syslog_attempts(self._find_attempts(SYSLOG_FAILED_PATTERN_BYTES, output))
+    
+    def _get_failed_attempts_linux(self):
+        """Get failed SSH login attempts from Linux logs."""
+        # Try the journal first (systemd-based systems)
+        try:
+            return self._read_journal()
+        except Exception as e:
+            logger.debug(f"Error reading the systemd journal: {e}")
+        
+        # If the journal is unavailable, try auth.log
+        attempts = []
+        try:
+            log_files = ["/var/log/auth.log", "/var/log/secure"]
+            attempts = self._parse_syslog_attempts(self._scan_log_files(log_files, SYSLOG_FAILED_PATTERN_BYTES))
+        except Exception as e:
+            logger.debug(f"Error parsing auth.log: {e}")
         
         return attempts
     
@@ -162,23 +310,7 @@ class SSHDefender:
         try:
             # macOS uses system.log or secure.log
             log_files = ["/var/log/system.log", "/var/log/secure.log"]
-            for log_file in log_files:
-                if os.path.exists(log_file):
-                    with open(log_file, 'r') as f:
-                        for line in f:
-                            if "sshd" in line and "Failed password" in line:
-                                match = re.search(r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)", line)
-                                if match:
-                                    try:
-                                        timestamp_str = match.group(1)
-                                        # Add year as log might not include it
-                                        if len(timestamp_str.split()) < 3:
-                                            timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                                        timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                                        ip = match.group(2)
-                                        attempts.append((timestamp, ip))
-                                    except Exception as e:
-                                        logger.debug(f"Error parsing timestamp: {e}")
+            attempts = self._parse_syslog_attempts(self._scan_log_files(log_files, SYSLOG_FAILED_PATTERN_BYTES))
         except Exception as e:
             logger.debug(f"Error parsing macOS logs: {e}")
             
@@ -186,47 +318,81 @@ class SSHDefender:
         if not attempts:
             try:
                 cmd = ["log", "show", "--predicate", "'process == \"sshd\"'", "--last", "1h"]
-                output = subprocess.check_output(cmd, universal_newlines=True)
-                pattern = r"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*sshd.*Failed password for .* from (\d+\.\d+\.\d+\.\d+)"
-                for line in output.splitlines():
-                    match = re.search(pattern, line)
-                    if match:
-                        try:
-                            timestamp = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
-                            ip = match.group(2)
-                            attempts.append((timestamp, ip))
-                        except Exception as e:
-                            logger.debug(f"Error parsing timestamp: {e}")
+                output = subprocess.check_output(cmd)
+                attempts = self._parse_iso_attempts(self._find_attempts(MACOS_LOG_FAILED_PATTERN_BYTES, output))
             except Exception as e:
                 logger.debug(f"Error using log command: {e}")
         
         return attempts
     
+    def _read_security_log(self):
+        """
+        Read recent failed SSH logons (event 4625) from the Windows Security log.
+        
+        Reads the log directly through win32evtlog, newest first, and stops at
+        the start of the time window.
+        
+        Returns:
+            list: (datetime, ip) tuples
+        """
+        attempts = []
+        window_start = datetime.now() - timedelta(minutes=self.time_window)
+        flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
+        handle = win32evtlog.OpenEventLog(None, 'Security')
+        try:
+            while True:
+                events = win32evtlog.ReadEventLog(handle, flags, 0)
+                if not events:
+                    break
+                for event in events:
+                    timestamp = datetime.fromtimestamp(event.TimeGenerated.timestamp())
+                    if timestamp < window_start:
+                        return attempts
+                    if event.EventID & 0xFFFF != SECURITY_LOGON_FAILED_EVENT_ID:
+                        continue
+                    inserts = event.StringInserts or ()
+                    if len(inserts) <= SECURITY_EVENT_IP_INDEX or not any('ssh' in value.lower() for value in inserts):
+                        continue
+                    ip = inserts[SECURITY_EVENT_IP_INDEX].strip()
+                    try:
+                        ipaddress.ip_address(ip)
+                        attempts.append((timestamp, ip))
+                    except ValueError:
+                        pass  # Local logons carry '-' instead of an address
+        finally:
+            win32evtlog.CloseEventLog(handle)
+        
+        return attempts
+    
     def _get_failed_attempts_windows(self):
         """Get failed SSH login attempts from Windows logs."""
         attempts = []
         
         try:
-            # On Windows, use PowerShell to query the Event Log
-            # This looks for Event ID 4625 (failed logon) and filters by SSH
-            cmd = [
-                "powershell",
-                "-Command",
-                "Get-WinEvent -FilterHashtable @{LogName='Security'; ID=4625} -MaxEvents 100 | "
-                "Where-Object { $_.Message -like '*ssh*' } | "
-                "ForEach-Object { $time = $_.TimeCreated; $ip = ($_.Message -split 'Source Network Address:')[1] -split '\\r\\n' | Select-Object -First 1; "
-                "if ($ip -match '\\d+\\.\\d+\\.\\d+\\.\\d+') { $ip.Trim() + ',' + $time.ToString('yyyy-MM-dd HH:mm:ss') } }"
-            ]
-            output = subprocess.check_output(cmd, universal_newlines=True)
-            
-            for line in output.splitlines():
-                if ',' in line:
-                    ip, timestamp_str = line.split(',', 1)
-                    try:
-                        timestamp = datetime.strptime(timestamp_str.strip(), "%Y-%m-%d %H:%M:%S")
-                        attempts.append((timestamp, ip.strip()))
-                    except Exception as e:
-                        logger.debug(f"Error parsing timestamp: {e}")
+            if WIN32EVTLOG_AVAILABLE:
+                # Read the Security log in-process instead of starting PowerShell every poll
+                attempts = self._read_security_log()
+            else:
+                # On Windows, use PowerShell to query the Event Log
+                # This looks for Event ID 4625 (failed logon) and filters by SSH
+                cmd = [
+                    "powershell",
+                    "-Command",
+                    "Get-WinEvent -FilterHashtable @{LogName='Security'; ID=4625} -MaxEvents 100 | "
+                    "Where-Object { $_.Message -like '*ssh*' } | "
+                    "ForEach-Object { $time = $_.TimeCreated; $ip = ($_.Message -split 'Source Network Address:')[1] -split '\\r\\n' | Select-Object -First 1; "
+                    "if ($ip -match '\\d+\\.\\d+\\.\\d+\\.\\d+') { $ip.Trim() + ',' + $time.ToString('yyyy-MM-dd HH:mm:ss') } }"
+                ]
+                output = subprocess.check_output(cmd, universal_newlines=True)
+                
+                for line in output.splitlines():
+                    if ',' in line:
+                        ip, timestamp_str = line.split(',', 1)
+                        try:
+                            timestamp = datetime.fromisoformat(timestamp_str.strip())
+                            attempts.append((timestamp, ip.strip()))
+                        except Exception as e:
+                            logger.debug(f"Error parsing timestamp: {e}")
         except Exception as e:
             logger.debug(f"Error querying Windows Event Log: {e}")
             
@@ -235,17 +401,8 @@ class SSHDefender:
             try:
                 ssh_log = os.path.expandvars("%ProgramData%\\ssh\\logs\\sshd.log")
                 if os.path.exists(ssh_log):
-                    with open(ssh_log, 'r') as f:
-                        for line in f:
-                            if "Failed password" in line:
-                                match = re.search(r"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*Failed password for .* from (\d+\.\d+\.\d+\.\d+)", line)
-                                if match:
-                                    try:
-                                        timestamp = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
-                                        ip = match.group(2)
-                                        attempts.append((timestamp, ip))
-                                    except Exception as e:
-                                        logger.debug(f"Error parsing timestamp: {e}")
+                    attempts = self._parse_iso_attempts(
+                        self._scan_log_file(ssh_log, OPENSSH_FAILED_PATTERN_BYTES))
             except Exception as e:
                 logger.debug(f"Error parsing OpenSSH logs: {e}")
         
@@ -253,23 +410,59 @@ class SSHDefender:
     
     def block_ip(self, ip):
         """Block an IP address using the system's firewall."""
-        if ip in self.whitelist:
-            logger.info(f"Skipping block for whitelisted IP: {ip}")
-            return
+        self.block_ips([ip])
+    
+    def block_ips(self, ips):
+        """Block several IP addresses, batching firewall updates where the platform allows."""
+        to_block = []
+        for ip in ips:
+            if ip in self.whitelist:
+                logger.info(f"Skipping block for whitelisted IP: {ip}")
+            elif self.dry_run:
+                logger.info(f"[DRY RUN] Would block IP: {ip}")
+            else:
+                to_block.append(ip)
         
-        if self.dry_run:
-            logger.info(f"[DRY RUN] Would block IP: {ip}")
+        if not to_block:
             return
         
         if self.platform.startswith('linux'):
-            self._block_ip_linux(ip)
+            self._block_ips_linux(to_block)
         elif self.platform == 'darwin':
-            self._block_ip_macos(ip)
+            for ip in to_block:
+                self._block_ip_macos(ip)
         elif self.platform == 'win32':
-            self._block_ip_windows(ip)
+            for ip in to_block:
+                self._block_ip_windows(ip)
         else:
             logger.error(f"Unsupported platform for blocking: {self.platform}")
     
+    def _ensure_ipset(self):
+        """Create the blocklist ipset and the iptables rule that drops SSH traffic from it."""
+        if self._ipset_ready:
+            return
+        
+        subprocess.run(["ipset", "create", IPSET_NAME, "hash:ip", "-exist"], check=True, stderr=subprocess.DEVNULL)
+        rule = ["INPUT", "-m", "set", "--match-set", IPSET_NAME, "src", "-p", "tcp", "--dport", "22", "-j", "DROP"]
+        if subprocess.run(["iptables", "-C"] + rule, stderr=subprocess.DEVNULL).returncode != 0:
+            subprocess.run(["iptables", "-I"] + rule, check=True)
+        self._ipset_ready = True
+    
+    def _block_ips_linux(self, ips):
+        """Block IP addresses on Linux with a single ipset update, falling back to per-IP rules."""
+        try:
+            self._ensure_ipset()
+            entries = "".join(f"add {IPSET_NAME} {ip}\n" for ip in ips)
+            subprocess.run(["ipset", "restore", "-exist"], input=entries, universal_newlines=True,
+                           check=True, stderr=subprocess.DEVNULL)
+            logger.info(f"Blocked {len(ips)} IP(s) using ipset: {', '.join(ips)}")
+            return
+        except Exception as e:
+            logger.debug(f"Could not block IPs with ipset: {e}")
+        
+        for ip in ips:
+            self._block_ip_linux(ip)
+    
     def _block_ip_linux(self, ip):
         """Block an IP address on Linux using iptables or ufw."""
         try:
@@ -355,8 +548,8 @@ class SSHDefender:
         # Get recent failed attempts
         attempts = self.get_failed_attempts()
         
-        # If no logs found, notify user
-        if not attempts:
+        # If no logs found and nothing is being tracked, notify user
+        if not attempts and not self.failed_attempts:
             logger.warning("No SSH login attempts found in logs. Make sure the SSH service is running and logging is enabled.")
             if self.platform == 'win32':
                 logger.info("On Windows, ensure OpenSSH Server is installed as an optional feature.")
@@ -366,20 +559,34 @@ class SSHDefender:
         now = datetime.now()
         window_start = now - timedelta(minutes=self.time_window)
         
-        # Update failed attempts dictionary
+        # Update failed attempts dictionary, keeping each IP's timestamps sorted
         for timestamp, ip in attempts:
             if timestamp >= window_start:
-                self.failed_attempts[ip].append(timestamp)
+                timestamps = self.failed_attempts[ip]
+                if timestamps and timestamp < timestamps[-1]:
+                    bisect.insort(timestamps, timestamp)
+                else:
+                    timestamps.append(timestamp)
         
         # Check for IPs that exceed the threshold
-        for ip, timestamps in self.failed_attempts.items():
-            # Only consider attempts within the time window
-            recent_attempts = [ts for ts in timestamps if ts >= window_start]
+        to_block = []
+        for ip in list(self.failed_attempts):
+            # Drop attempts that have fallen out of the time window
+            recent_attempts = self.failed_attempts[ip]
+            while recent_attempts and recent_attempts[0] < window_start:
+                recent_attempts.popleft()
+            if not recent_attempts:
+                del self.failed_attempts[ip]
+                continue
             
             if len(recent_attempts) >= self.threshold and ip not in self.blocked_ips:
                 logger.warning(f"IP {ip} exceeded threshold with {len(recent_attempts)} failed attempts in the last {self.time_window} minutes")
-                self.block_ip(ip)
-                self.blocked_ips.add(ip)
+                to_block.append(ip)
+        
+        # Block all offending IPs in one batch
+        if to_block:
+            self.block_ips(to_block)
+            self.blocked_ips.update(to_block)
     
     def monitor(self, interval=60):
         """Monitor SSH login attempts continuously."""
@@ -6,25 +6,34 @@ and distributed attack detection capabilities.
 """
 
 import argparse
+import atexit
+import bisect
+import heapq
+import mmap
 import os
 import re
 import sys
+import signal
 import time
 import json
+import queue
 import yaml
 import socket
 import smtplib
 import logging
 import ipaddress
 import subprocess
+import threading
+import functools
+import xml.etree.ElementTree as ET
 import dns.resolver
 from pathlib import Path
-from datetime import datetime, timedelta
-from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict, deque, Counter, OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from ipaddress import ip_address, ip_network
-from dateutil import parser as date_parser
 from timezonefinder import TimezoneFinder
 from slack_sdk.webhook import WebhookClient
 
@@ -36,6 +45,34 @@ try:
 except ImportError:
     GEOIP_AVAILABLE = False
 
+# Optional RE2 engine for log scanning (linear-time DFA matching, no backtracking)
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+# Optional native Windows Event Log API (pywin32)
+try:
+    import win32evtlog
+    WIN32EVTLOG_AVAILABLE = True
+except ImportError:
+    WIN32EVTLOG_AVAILABLE = False
+
+# Optional COM access to Windows Firewall (pywin32)
+try:
+    import win32com.client
+    WIN32COM_AVAILABLE = True
+except ImportError:
+    WIN32COM_AVAILABLE = False
+
+# Optional faster JSON encoder/decoder for the state file
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -48,6 +85,8 @@ logger = logging.getLogger(__name__)
 DEFAULT_THRESHOLD = 5
 DEFAULT_TIME_WINDOW = 5
 DEFAULT_BLOCK_DURATION = 1440  # 24 hours in minutes
+IPSET_NAME = "sshdefender"  # Kernel IP set holding blocked addresses (Linux)
+IPSET_MAX_TIMEOUT = 2147483  # Largest per-entry timeout ipset accepts, in seconds
 DEFAULT_CONFIG_PATHS = {
     'linux': '/etc/ssh-defender.yaml',
     'darwin': os.path.expanduser('~/Library/ssh-defender.conf'),
@@ -63,6 +102,44 @@ DEFAULT_STATE_FILE = {
     'darwin': os.path.expanduser('~/Library/Application Support/ssh-defender/state.json'),
     'win32': os.path.expandvars(r'C:\ssh-defender\state.json')
 }
+# Failed SSH password patterns capturing (timestamp, invalid-user marker, username, ip),
+# matched against whole log buffers as bytes
+_regex = re2 if RE2_AVAILABLE else re
+FAILED_PATTERN = _regex.compile(rb"(\w+ +\d+ +\d+:\d+:\d+).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)")
+FAILED_PATTERN_ISO = _regex.compile(rb"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)")
+FAILED_PATTERN_OPENSSH = _regex.compile(rb"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)")
+SECURITY_LOGON_FAILED_EVENT_ID = 4625
+EVENT_XML_NS = "{http://schemas.microsoft.com/win/2004/08/events/event}"  # Namespace of rendered event XML
+EVT_BATCH_SIZE = 100  # Events fetched per EvtNext call
+JOURNAL_CURSOR_PATTERN = re.compile(rb"^-- cursor: (.+)$", re.MULTILINE)  # Printed by journalctl --show-cursor
+FAILED_MARKER = b"Failed password for "  # Literal every failed-password line contains
+# Firewall rule arguments shared by every block and unblock, spliced around the source IP
+IPTABLES_SSH_DROP = ("-p", "tcp", "--dport", "22", "-j", "DROP")  # Follows "INPUT -s <ip>"
+UFW_SSH_PORT = ("to", "any", "port", "22")  # Follows "deny from <ip>"
+NFT_INPUT_CHAIN = ("inet", "filter", "input")
+NFT_SSH_DROP = ("tcp", "dport", "22", "drop")  # Follows "ip saddr <ip>"
+# Per-IP SSH drop rules as listed by "iptables -S INPUT"
+IPTABLES_DROP_RULE_PATTERN = re.compile(r"^-A INPUT -s (\d+\.\d+\.\d+\.\d+)/32 .*--dport 22 -j DROP$", re.MULTILINE)
+# Syslog month abbreviations, used to parse timestamps without strptime
+MONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+          'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+GEO_CACHE_SIZE = 4096  # Number of IP geolocation results kept in memory
+WHITELIST_CACHE_SIZE = 8192  # Number of whitelist check results kept in memory
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # Timestamps in the audit log and alerts
+TIMESTAMP_CACHE_SIZE = 256  # Distinct formatted seconds kept in memory
+RDNS_CACHE_SIZE = 4096  # Number of reverse DNS results kept in memory
+RDNS_CACHE_TTL = 900  # Seconds to reuse a resolved hostname
+RDNS_NEGATIVE_TTL = 300  # Seconds to reuse a failed reverse lookup
+RDNS_MAX_WORKERS = 32  # Concurrent reverse lookups when resolving a batch of IPs
+RDNS_TIMEOUT = 1  # Seconds to wait for each nameserver to answer a PTR query
+RDNS_LIFETIME = 2  # Seconds to spend on a PTR query across all nameservers
+USER_TARGETS_MAX = 10000  # Usernames tracked for distributed attack detection
+AUDIT_QUEUE_SIZE = 10000  # Audit log entries allowed to wait for the writer thread
+AUDIT_BATCH_SIZE = 256  # Audit log entries written per flush under load
+AUDIT_FLUSH_INTERVAL = 0.25  # Seconds before queued audit log entries are flushed
+AUDIT_BUFFER_SIZE = 64 * 1024  # Bytes buffered by the audit log file handle
+ALERT_MAX_WORKERS = 4  # Threads sending Slack and email alerts
+ALERT_BACKLOG_SIZE = 100  # Alerts allowed to be pending before new ones are dropped
 GEOIP_DB_PATHS = [
     '/usr/share/GeoIP/GeoLite2-City.mmdb',
     '/usr/local/share/GeoIP/GeoLite2-City.mmdb',
@@ -130,6 +207,95 @@ HTML_EMAIL_TEMPLATE = """
 </body>
 </html>
 """
+# Static fields shared by every Slack alert attachment
+SLACK_ATTACHMENT_FOOTER = {
+    "footer": "SSH Defender",
+    "footer_icon": "https://platform.slack-edge.com/img/default_application_icon.png"
+}
+# {{ name }} placeholders in HTML_EMAIL_TEMPLATE, filled in with a single substitution pass
+EMAIL_PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# {% for %} block in HTML_EMAIL_TEMPLATE, replaced by the pre-rendered related IP rows
+EMAIL_LOOP_PATTERN = re.compile(r"\{%\s*for \w+ in \w+\s*%\}.*?\{%\s*endfor\s*%\}", re.S)
+# {% if name %} sections in HTML_EMAIL_TEMPLATE, kept only when the placeholder value is set
+EMAIL_CONDITIONAL_PATTERN = re.compile(r"\{%\s*if (\w+)\s*%\}(.*?)\{%\s*endif\s*%\}", re.S)
+
+@functools.lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def _format_epoch(seconds):
+    """Format whole epoch seconds as a local timestamp string."""
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(seconds))
+
+def format_timestamp(epoch=None):
+    """
+    Format epoch seconds as a local "YYYY-MM-DD HH:MM:SS" timestamp.
+    
+    Results are cached per second, so log entries and alerts written in a burst,
+    and blocks sharing one expiry, reuse the same string.
+    
+    Args:
+        epoch: Seconds since the epoch, defaults to now
+    
+    Returns:
+        str: Formatted timestamp
+    """
+    return _format_epoch(int(time.time() if epoch is None else epoch))
+
+class _AuditLogger:
+    """
+    Append entries to the audit log from a background thread.
+    
+    Callers only queue entries; the writer keeps one buffered file handle open
+    and flushes every AUDIT_BATCH_SIZE entries or AUDIT_FLUSH_INTERVAL seconds.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def enqueue(self, entry):
+        """Queue an entry for writing, dropping it if the writer has fallen too far behind."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning(f"Audit log queue full, dropping entry: {entry.strip()}")
+    
+    def close(self):
+        """Write any queued entries and stop the writer thread."""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=AUDIT_FLUSH_INTERVAL)
+                self._thread.join(timeout=5)
+            except queue.Full:
+                logger.error("Audit log writer is not draining, queued entries may be lost")
+    
+    def _run(self):
+        """Drain the queue into the audit file until close() queues the None sentinel."""
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            with open(self.path, 'a', buffering=AUDIT_BUFFER_SIZE) as f:
+                while True:
+                    try:
+                        entry = self._queue.get(timeout=AUDIT_FLUSH_INTERVAL)
+                    except queue.Empty:
+                        entry = ''
+                    
+                    if entry is None:
+                        f.writelines(batch)
+                        return
+                    if entry:
+                        batch.append(entry)
+                    
+                    if batch and (len(batch) >= AUDIT_BATCH_SIZE or
+                                  time.monotonic() - last_flush >= AUDIT_FLUSH_INTERVAL):
+                        f.writelines(batch)
+                        f.flush()
+                        batch.clear()
+                        last_flush = time.monotonic()
+        except Exception as e:
+            logger.error(f"Failed to write audit log {self.path}: {e}")
 
 class AdvancedSSHDefender:
     """Advanced SSH defender with real-time alerts and distributed attack detection."""
@@ -152,13 +318,56 @@ class AdvancedSSHDefender:
         self.whitelist = set()
         self.cidr_whitelist = []
         self.dry_run = False
-        self.failed_attempts = defaultdict(list)
-        self.blocked_ips = {}  # {ip: expiry_time}
-        self.user_targets = defaultdict(set)  # {username: set(ips)}
+        self.failed_attempts = defaultdict(deque)
+        self.blocked_ips = {}  # {ip: expiry as epoch seconds}
+        self._expiry_heap = []  # (expiry, ip) min-heap; entries no longer matching blocked_ips are skipped
+        self.user_targets = OrderedDict()  # {username: {ip: last attempt time}}, least recently targeted first
+        self._user_targets_dirty = set()  # Usernames targeted since the last detection pass
+        self._last_reported = {}  # {username: frozenset of IPs already alerted on as a distributed attack}
         self.distributed_detection = True
         self.alerts_enabled = True
         self.geo_enabled = GEOIP_AVAILABLE
         self.emergency_unblock_key = None
+        self.block_log_path = None
+        self.state_file = None
+        self.username_threshold = 5
+        self.timing_sensitivity = 'medium'
+        self.geo_detection = False
+        self.slack_enabled = False
+        self.slack_webhook = None
+        self.slack_channel = '#security-alerts'
+        self.email_enabled = False
+        self.smtp_server = None
+        self.smtp_port = 587
+        self.smtp_use_tls = True
+        self.smtp_username = None
+        self.smtp_password = None
+        self.email_from = None
+        self.email_to = []
+        self.log_cursors = {}  # {log_file: {'inode': st_ino, 'offset': bytes scanned}}
+        self._journal_cursor = None  # journalctl cursor of the last entry read
+        # Whether the ipset and its iptables rule have been set up
+        self._ipset_ready = False
+        # IPs with a per-IP iptables drop rule, loaded on first use
+        self._installed_rules = None
+        # IPs blocked with per-IP ufw, iptables or nft rules instead of the ipset
+        self._rule_blocked_ips = set()
+        # Background writer for the audit log, started on the first logged action
+        self._audit_logger = None
+        # Whether blocks or log cursors changed since the state file was last written
+        self._state_dirty = False
+        # Append-only record of blocks and unblocks since the state file was last written
+        self._state_journal = None
+        # Alerts are sent from a thread pool, started on the first alert
+        self._alert_pool = None
+        self._alert_slots = threading.BoundedSemaphore(ALERT_BACKLOG_SIZE)
+        self._slack_client = None
+        # SMTP connection kept open between email alerts, used only under _smtp_lock
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        atexit.register(self.close_smtp)
+        # Guards the geo and reverse DNS caches, which alert threads also read
+        self._cache_lock = threading.Lock()
         
         # Load configuration
         if config:
@@ -169,8 +378,22 @@ class AdvancedSSHDefender:
             if value is not None and hasattr(self, key):
                 setattr(self, key, value)
         
+        # Create the audit log directory once here rather than on every logged block
+        log_dir = os.path.dirname(self.block_log_path) if self.block_log_path else None
+        if log_dir:
+            try:
+                os.makedirs(log_dir, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Failed to create audit log directory {log_dir}: {e}")
+        
+        # Pack CIDR whitelist into sorted integer ranges for binary search
+        self._build_whitelist_ranges()
+        
         # Initialize GeoIP database if available
         self.geoip_reader = None
+        self._geo_cache = OrderedDict()  # {ip: geo info dict or None}, least recently used first
+        self._rdns_cache = OrderedDict()  # {ip: (expiry as time.monotonic(), hostname or None)}, least recently used first
+        self._resolver = self._init_resolver()
         if self.geo_enabled:
             self._init_geoip()
         
@@ -284,31 +507,113 @@ class AdvancedSSHDefender:
                 logger.warning("Unable to check for Administrator privileges on Windows.")
     
     def _load_state(self):
-        """Load persistent state from file."""
-        if hasattr(self, 'state_file') and self.state_file and os.path.exists(self.state_file):
+        """Load persistent state from file, then replay the blocks and unblocks journaled after it."""
+        if not self.state_file:
+            return
+        
+        if os.path.exists(self.state_file):
             try:
-                with open(self.state_file, 'r') as f:
-                    state = json.load(f)
+                with open(self.state_file, 'rb') as f:
+                    data = f.read()
+                state = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
                 
                 # Load blocked IPs with expiry times
                 if 'blocked_ips' in state:
-                    now = datetime.now()
-                    for ip, expiry_str in state['blocked_ips'].items():
+                    now = int(time.time())
+                    for ip, expiry in state['blocked_ips'].items():
                         try:
-                            expiry = date_parser.parse(expiry_str)
+                            # State files from older versions store ISO timestamps and
+                            # don't record how the IP was blocked, so remove it as a rule too
+                            if isinstance(expiry, str):
+                                expiry = int(datetime.fromisoformat(expiry).timestamp())
+                                self._rule_blocked_ips.add(ip)
                             if expiry > now:  # Only load non-expired blocks
                                 self.blocked_ips[ip] = expiry
-                                logger.info(f"Loaded persistent block for IP {ip} until {expiry}")
+                                logger.info(f"Loaded persistent block for IP {ip} until {datetime.fromtimestamp(expiry)}")
                         except Exception as e:
                             logger.debug(f"Error parsing expiry for IP {ip}: {e}")
                 
+                self._rule_blocked_ips.update(state.get('rule_blocked_ips', []))
+                
+                # Resume log scanning where the previous run stopped
+                self.log_cursors = state.get('log_cursors', {})
+                
                 logger.info(f"Loaded {len(self.blocked_ips)} persistent IP blocks from {self.state_file}")
             except Exception as e:
                 logger.error(f"Error loading state file: {e}")
+        
+        self._replay_state_journal()
+        self._rule_blocked_ips.intersection_update(self.blocked_ips)
+        
+        # Index the loaded blocks by expiry
+        self._expiry_heap = [(expiry, ip) for ip, expiry in self.blocked_ips.items()]
+        heapq.heapify(self._expiry_heap)
+    
+    def _replay_state_journal(self):
+        """Apply journaled blocks and unblocks that were not yet written to the state file."""
+        journal_file = f"{self.state_file}.journal"
+        if not os.path.exists(journal_file):
+            return
+        
+        now = int(time.time())
+        replayed = 0
+        try:
+            with open(journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line) if ORJSON_AVAILABLE else json.loads(line)
+                    except ValueError:
+                        continue  # Line cut short by a crash mid-write
+                    
+                    if entry['op'] == 'block' and entry['expiry'] > now:
+                        self.blocked_ips[entry['ip']] = entry['expiry']
+                        if entry.get('rule'):
+                            self._rule_blocked_ips.add(entry['ip'])
+                    else:
+                        self.blocked_ips.pop(entry['ip'], None)
+                    replayed += 1
+        except Exception as e:
+            logger.error(f"Error replaying state journal: {e}")
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} journaled block changes from {journal_file}")
+            # Fold the journal into the state file on the next flush
+            self._state_dirty = True
+    
+    def _journal_state(self, op, ips, expiry=None):
+        """
+        Append block or unblock entries to the state journal.
+        
+        Each entry is a short sequential write, so changes survive a crash without
+        rewriting the whole state file; flush_state folds them into the snapshot.
+        
+        Args:
+            op: 'block' or 'unblock'
+            ips: IP address strings
+            expiry: Block expiry as epoch seconds, for 'block' entries
+        """
+        if not self.state_file:
+            return
+        
+        try:
+            if self._state_journal is None:
+                state_dir = os.path.dirname(self.state_file)
+                if state_dir and not os.path.exists(state_dir):
+                    os.makedirs(state_dir, exist_ok=True)
+                self._state_journal = open(f"{self.state_file}.journal", 'ab')
+            
+            entries = [{'op': op, 'ip': ip, 'expiry': expiry, 'rule': ip in self._rule_blocked_ips} for ip in ips]
+            if ORJSON_AVAILABLE:
+                self._state_journal.write(b"".join(orjson.dumps(entry) + b"\n" for entry in entries))
+            else:
+                self._state_journal.write("".join(json.dumps(entry) + "\n" for entry in entries).encode('utf-8'))
+            self._state_journal.flush()
+        except Exception as e:
+            logger.error(f"Error writing state journal: {e}")
     
     def _save_state(self):
         """Save persistent state to file."""
-        if hasattr(self, 'state_file') and self.state_file:
+        if self.state_file:
             try:
                 # Create directory if it doesn't exist
                 state_dir = os.path.dirname(self.state_file)
@@ -316,31 +621,92 @@ class AdvancedSSHDefender:
                     os.makedirs(state_dir, exist_ok=True)
                 
                 state = {
-                    'blocked_ips': {ip: expiry.isoformat() for ip, expiry in self.blocked_ips.items()},
+                    'blocked_ips': self.blocked_ips,
+                    'rule_blocked_ips': sorted(self._rule_blocked_ips),
+                    'log_cursors': self.log_cursors,
                     'last_update': datetime.now().isoformat()
                 }
                 
-                with open(self.state_file, 'w') as f:
-                    json.dump(state, f, indent=2)
+                if ORJSON_AVAILABLE:
+                    payload = orjson.dumps(state, option=orjson.OPT_INDENT_2)
+                else:
+                    payload = json.dumps(state, indent=2).encode('utf-8')
+                
+                # Write a temporary file and rename it over the old one, so a crash
+                # mid-write never leaves a truncated state file
+                tmp_file = f"{self.state_file}.tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.state_file)
+                
+                # The snapshot now covers everything journaled so far
+                if self._state_journal is not None:
+                    self._state_journal.close()
+                    self._state_journal = None
+                try:
+                    os.remove(f"{self.state_file}.journal")
+                except FileNotFoundError:
+                    pass
                 
                 logger.debug(f"Saved state to {self.state_file}")
             except Exception as e:
                 logger.error(f"Error saving state file: {e}")
     
+    def flush_state(self):
+        """Write the state file if blocks or log cursors changed since the last write."""
+        if self._state_dirty:
+            self._save_state()
+            self._state_dirty = False
+    
+    def _build_whitelist_ranges(self):
+        """Merge the CIDR whitelist into sorted, non-overlapping integer ranges per IP version."""
+        # The --whitelist option replaces the set with a list
+        self.whitelist = set(self.whitelist)
+        self._wl_cache = OrderedDict()  # {ip: whitelisted}, oldest first
+        self._wl_ranges = {}  # {version: (sorted range starts, matching range ends)}
+        for version in (4, 6):
+            ranges = sorted((int(cidr.network_address), int(cidr.broadcast_address))
+                            for cidr in self.cidr_whitelist if cidr.version == version)
+            starts, ends = [], []
+            for start, end in ranges:
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            if starts:
+                self._wl_ranges[version] = (starts, ends)
+    
     def is_whitelisted(self, ip):
-        """Check if an IP is whitelisted."""
+        """Check if an IP is whitelisted, remembering the answer since attacking IPs repeat."""
+        whitelisted = self._wl_cache.get(ip)
+        if whitelisted is None:
+            whitelisted = self._match_whitelist(ip)
+            self._wl_cache[ip] = whitelisted
+            if len(self._wl_cache) > WHITELIST_CACHE_SIZE:
+                self._wl_cache.popitem(last=False)
+        return whitelisted
+    
+    def _match_whitelist(self, ip):
+        """Check an IP against the whitelisted IPs and CIDR ranges."""
         if ip in self.whitelist:
             return True
         
         try:
             ip_obj = ip_address(ip)
-            for cidr in self.cidr_whitelist:
-                if ip_obj in cidr:
-                    return True
         except ValueError:
-            pass
+            return False
         
-        return False
+        ranges = self._wl_ranges.get(ip_obj.version)
+        if not ranges:
+            return False
+        
+        starts, ends = ranges
+        ip_int = int(ip_obj)
+        i = bisect.bisect_right(starts, ip_int) - 1
+        return i >= 0 and ip_int <= ends[i]
     
     def get_failed_attempts(self):
         """Parse logs to find failed SSH login attempts with usernames."""
@@ -354,58 +720,132 @@ class AdvancedSSHDefender:
             logger.error(f"Unsupported platform: {self.platform}")
             return []
     
+    def _find_failed_attempts(self, pattern, buffer, start=0, end=None):
+        """
+        Find all failed password attempts in a log buffer.
+        
+        A plain substring search (memmem in C) skips lines that cannot match,
+        so the regex only runs on the few lines containing FAILED_MARKER.
+        
+        Args:
+            pattern (re.Pattern): Compiled bytes pattern capturing (timestamp, invalid marker, username, ip)
+            buffer (bytes): Raw log contents (bytes or a memory map)
+            start (int): Offset to start matching at
+            end (int): Offset to stop matching at (defaults to the end of the buffer)
+            
+        Returns:
+            list: (timestamp string, username, ip) tuples
+        """
+        if end is None:
+            end = len(buffer)
+        
+        results = []
+        pos = buffer.find(FAILED_MARKER, start, end)
+        while pos != -1:
+            line_start = buffer.rfind(b"\n", start, pos) + 1 or start
+            line_end = buffer.find(b"\n", pos, end)
+            if line_end == -1:
+                line_end = end
+            
+            match = pattern.search(buffer, line_start, line_end)
+            if match:
+                results.append((match.group(1).decode('ascii'), match.group(3).decode('ascii'),
+                                match.group(4).decode('ascii')))
+            pos = buffer.find(FAILED_MARKER, line_end, end)
+        
+        return results
+    
+    def _scan_log_file(self, log_file, pattern):
+        """
+        Scan the new part of a log file for failed password attempts.
+        
+        The file is memory-mapped so the kernel pages it in on demand, and the
+        bytes pattern runs over the mapping directly, starting at the saved
+        cursor. The file is rescanned from the start if it was rotated
+        (inode changed) or truncated.
+        
+        Args:
+            log_file (str): Path to the log file
+            pattern (re.Pattern): Compiled bytes pattern capturing (timestamp, invalid marker, username, ip)
+            
+        Returns:
+            list: (timestamp string, username, ip) tuples
+        """
+        with open(log_file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            cursor = self.log_cursors.get(log_file)
+            offset = 0
+            if cursor and cursor.get('inode') == stat.st_ino and cursor.get('offset', 0) <= stat.st_size:
+                offset = cursor['offset']
+            if stat.st_size == offset:
+                self.log_cursors[log_file] = {'inode': stat.st_ino, 'offset': offset}
+                return []  # Nothing new (also avoids mapping empty files)
+            
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Stop at the last complete line; a partially written line is read next time
+                end = mm.rfind(b'\n', offset) + 1
+                if end <= offset:
+                    return []
+                self.log_cursors[log_file] = {'inode': stat.st_ino, 'offset': end}
+                self._state_dirty = True
+                return self._find_failed_attempts(pattern, mm, offset, end)
+    
+    def _parse_syslog_attempts(self, matches):
+        """Convert (syslog timestamp, username, ip) tuples into (datetime, ip, username) attempts."""
+        attempts = []
+        # Syslog timestamps (e.g. "Jan  5 10:00:01") do not include the year
+        year = datetime.now().year
+        for timestamp_str, username, ip in matches:
+            try:
+                month, day, hms = timestamp_str.split()
+                hour, minute, second = hms.split(':')
+                timestamp = datetime(year, MONTHS[month], int(day), int(hour), int(minute), int(second))
+                attempts.append((timestamp, ip, username))
+            except Exception as e:
+                logger.debug(f"Error parsing timestamp: {e}")
+        return attempts
+    
+    def _parse_iso_attempts(self, matches):
+        """Convert (YYYY-MM-DD HH:MM:SS, username, ip) tuples into (datetime, ip, username) attempts."""
+        attempts = []
+        for timestamp_str, username, ip in matches:
+            try:
+                timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+                attempts.append((timestamp, ip, username))
+            except Exception as e:
+                logger.debug(f"Error parsing timestamp: {e}")
+        return attempts
+    
     def _get_failed_attempts_linux(self):
         """Get failed SSH login attempts from Linux logs with username extraction."""
-        attempts = []
-        
         # Try using journalctl first (systemd-based systems)
         try:
-            cmd = ["journalctl", "-u", "ssh", "-n", "1000", "--no-pager"]
-            output = subprocess.check_output(cmd, universal_newlines=True)
+            cmd = ["journalctl", "-u", "ssh", "-u", "sshd", "--no-pager", "--show-cursor"]
+            if self._journal_cursor:
+                # Only read entries written since the previous poll
+                cmd += ["--after-cursor", self._journal_cursor]
+            else:
+                cmd += ["--since", f"-{self.time_window}min"]
+            output = subprocess.check_output(cmd)
             
-            # Extract failed password attempts with username
-            pattern = r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)"
-            for line in output.splitlines():
-                match = re.search(pattern, line)
-                if match:
-                    try:
-                        timestamp_str = match.group(1)
-                        # Add year as journalctl might not include it
-                        if len(timestamp_str.split()) < 3:
-                            timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                        timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                        username = match.group(3)
-                        ip = match.group(4)
-                        attempts.append((timestamp, ip, username))
-                    except Exception as e:
-                        logger.debug(f"Error parsing timestamp: {e}")
+            cursor = JOURNAL_CURSOR_PATTERN.search(output)
+            if cursor:
+                self._journal_cursor = cursor.group(1).decode('ascii')
+            
+            # Extract failed password attempts with username from the whole output in one pass
+            return self._parse_syslog_attempts(self._find_failed_attempts(FAILED_PATTERN, output))
         except Exception as e:
             logger.debug(f"Error using journalctl: {e}")
         
-        # If journalctl failed or found no results, try auth.log
-        if not attempts:
-            try:
-                log_files = ["/var/log/auth.log", "/var/log/secure"]
-                for log_file in log_files:
-                    if os.path.exists(log_file):
-                        with open(log_file, 'r') as f:
-                            for line in f:
-                                if "sshd" in line and "Failed password" in line:
-                                    match = re.search(r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)", line)
-                                    if match:
-                                        try:
-                                            timestamp_str = match.group(1)
-                                            # Add year as auth.log might not include it
-                                            if len(timestamp_str.split()) < 3:
-                                                timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                                            timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                                            username = match.group(3)
-                                            ip = match.group(4)
-                                            attempts.append((timestamp, ip, username))
-                                        except Exception as e:
-                                            logger.debug(f"Error parsing timestamp: {e}")
-            except Exception as e:
-                logger.debug(f"Error parsing auth.log: {e}")
+        # The journal is unavailable, so try auth.log (it holds the same entries, reading both double-counts)
+        attempts = []
+        try:
+            log_files = ["/var/log/auth.log", "/var/log/secure"]
+            for log_file in log_files:
+                if os.path.exists(log_file):
+                    attempts.extend(self._parse_syslog_attempts(self._scan_log_file(log_file, FAILED_PATTERN)))
+        except Exception as e:
+            logger.debug(f"Error parsing auth.log: {e}")
         
         return attempts
     
@@ -418,22 +858,7 @@ class AdvancedSSHDefender:
             log_files = ["/var/log/system.log", "/var/log/secure.log"]
             for log_file in log_files:
                 if os.path.exists(log_file):
-                    with open(log_file, 'r') as f:
-                        for line in f:
-                            if "sshd" in line and "Failed password" in line:
-                                match = re.search(r"(\w+\s+\d+\s+\d+:\d+:\d+).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)", line)
-                                if match:
-                                    try:
-                                        timestamp_str = match.group(1)
-                                        # Add year as log might not include it
-                                        if len(timestamp_str.split()) < 3:
-                                            timestamp_str = f"{datetime.now().year} {timestamp_str}"
-                                        timestamp = datetime.strptime(timestamp_str, "%Y %b %d %H:%M:%S")
-                                        username = match.group(3)
-                                        ip = match.group(4)
-                                        attempts.append((timestamp, ip, username))
-                                    except Exception as e:
-                                        logger.debug(f"Error parsing timestamp: {e}")
+                    attempts.extend(self._parse_syslog_attempts(self._scan_log_file(log_file, FAILED_PATTERN)))
         except Exception as e:
             logger.debug(f"Error parsing macOS logs: {e}")
             
@@ -441,70 +866,94 @@ class AdvancedSSHDefender:
         if not attempts:
             try:
                 cmd = ["log", "show", "--predicate", "'process == \"sshd\"'", "--last", "1h"]
-                output = subprocess.check_output(cmd, universal_newlines=True)
-                pattern = r"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*sshd.*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)"
-                for line in output.splitlines():
-                    match = re.search(pattern, line)
-                    if match:
-                        try:
-                            timestamp = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
-                            username = match.group(3)
-                            ip = match.group(4)
-                            attempts.append((timestamp, ip, username))
-                        except Exception as e:
-                            logger.debug(f"Error parsing timestamp: {e}")
+                output = subprocess.check_output(cmd)
+                attempts = self._parse_iso_attempts(self._find_failed_attempts(FAILED_PATTERN_ISO, output))
             except Exception as e:
                 logger.debug(f"Error using log command: {e}")
         
         return attempts
     
+    def _query_security_log(self):
+        """
+        Query recent failed SSH logons (event 4625) from the Windows Security log.
+        
+        Uses the EvtQuery API so the event log service applies the time-window
+        filter, and reads fields from the structured event XML.
+        
+        Returns:
+            list: (datetime, ip, username) tuples
+        """
+        attempts = []
+        window_ms = self.time_window * 60 * 1000
+        query = (f"*[System[EventID={SECURITY_LOGON_FAILED_EVENT_ID} and "
+                 f"TimeCreated[timediff(@SystemTime) <= {window_ms}]]]")
+        flags = win32evtlog.EvtQueryChannelPath | win32evtlog.EvtQueryReverseDirection
+        handle = win32evtlog.EvtQuery('Security', flags, query)
+        
+        while True:
+            events = win32evtlog.EvtNext(handle, EVT_BATCH_SIZE)
+            if not events:
+                break
+            for event in events:
+                root = ET.fromstring(win32evtlog.EvtRender(event, win32evtlog.EvtRenderEventXml))
+                data = {item.get('Name'): (item.text or '') for item in root.iter(f"{EVENT_XML_NS}Data")}
+                if not any('ssh' in value.lower() for value in data.values()):
+                    continue
+                
+                ip = data.get('IpAddress', '').strip()
+                try:
+                    ipaddress.ip_address(ip)
+                except ValueError:
+                    continue  # Local logons carry '-' instead of an address
+                
+                # SystemTime is UTC (e.g. 2024-01-05T10:00:01.1234567Z); convert to naive local time
+                system_time = root.find(f"{EVENT_XML_NS}System/{EVENT_XML_NS}TimeCreated").get('SystemTime')
+                timestamp = (datetime.fromisoformat(system_time[:19])
+                             .replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None))
+                attempts.append((timestamp, ip, data.get('TargetUserName', '').strip()))
+        
+        return attempts
+    
     def _get_failed_attempts_windows(self):
         """Get failed SSH login attempts from Windows logs with username extraction."""
         attempts = []
         
         try:
-            # On Windows, use PowerShell to query the Event Log
-            cmd = [
-                "powershell",
-                "-Command",
-                "Get-WinEvent -FilterHashtable @{LogName='Security'; ID=4625} -MaxEvents 100 | "
-                "Where-Object { $_.Message -like '*ssh*' } | "
-                "ForEach-Object { $time = $_.TimeCreated; "
-                "$user = ($_.Message -split 'Account Name:')[1] -split '\\r\\n' | Select-Object -First 1; "
-                "$ip = ($_.Message -split 'Source Network Address:')[1] -split '\\r\\n' | Select-Object -First 1; "
-                "if ($ip -match '\\d+\\.\\d+\\.\\d+\\.\\d+') { $ip.Trim() + ',' + $user.Trim() + ',' + $time.ToString('yyyy-MM-dd HH:mm:ss') } }"
-            ]
-            output = subprocess.check_output(cmd, universal_newlines=True)
+            if WIN32EVTLOG_AVAILABLE:
+                # Query the Security log in-process instead of starting PowerShell every poll
+                attempts = self._query_security_log()
+            else:
+                # On Windows, use PowerShell to query the Event Log
+                cmd = [
+                    "powershell",
+                    "-Command",
+                    "Get-WinEvent -FilterHashtable @{LogName='Security'; ID=4625} -MaxEvents 100 | "
+                    "Where-Object { $_.Message -like '*ssh*' } | "
+                    "ForEach-Object { $time = $_.TimeCreated; "
+                    "$user = ($_.Message -split 'Account Name:')[1] -split '\\r\\n' | Select-Object -First 1; "
+                    "$ip = ($_.Message -split 'Source Network Address:')[1] -split '\\r\\n' | Select-Object -First 1; "
+                    "if ($ip -match '\\d+\\.\\d+\\.\\d+\\.\\d+') { $ip.Trim() + ',' + $user.Trim() + ',' + $time.ToString('yyyy-MM-dd HH:mm:ss') } }"
+                ]
+                output = subprocess.check_output(cmd, universal_newlines=True)
             
-            for line in output.splitlines():
-                parts = line.split(',')
-                if len(parts) == 3:
-                    ip, username, timestamp_str = parts
-                    try:
-                        timestamp = datetime.strptime(timestamp_str.strip(), "%Y-%m-%d %H:%M:%S")
-                        attempts.append((timestamp, ip.strip(), username.strip()))
-                    except Exception as e:
-                        logger.debug(f"Error parsing timestamp: {e}")
+                for line in output.splitlines():
+                    parts = line.split(',')
+                    if len(parts) == 3:
+                        ip, username, timestamp_str = parts
+                        try:
+                            timestamp = datetime.strptime(timestamp_str.strip(), "%Y-%m-%d %H:%M:%S")
+                            attempts.append((timestamp, ip.strip(), username.strip()))
+                        except Exception as e:
+                            logger.debug(f"Error parsing timestamp: {e}")
         except Exception as e:
             logger.debug(f"Error querying Windows Event Log: {e}")
             
-        # If PowerShell approach fails, try parsing the OpenSSH logs if they exist
+        # If the Event Log query fails, try parsing the OpenSSH logs if they exist
         if not attempts:
             try:
                 ssh_log = os.path.expandvars("%ProgramData%\\ssh\\logs\\sshd.log")
                 if os.path.exists(ssh_log):
-                    with open(ssh_log, 'r') as f:
-                        for line in f:
-                            if "Failed password" in line:
-                                match = re.search(r"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}).*Failed password for (invalid user )?(\w+) from (\d+\.\d+\.\d+\.\d+)", line)
-                                if match:
-                                    try:
-                                        timestamp = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
-                                        username = match.group(3)
-                                        ip = match.group(4)
-                                        attempts.append((timestamp, ip, username))
-                                    except Exception as e:
-                                        logger.debug(f"Error parsing timestamp: {e}")
+                    attempts = self._parse_iso_attempts(self._scan_log_file(ssh_log, FAILED_PATTERN_OPENSSH))
             except Exception as e:
                 logger.debug(f"Error parsing OpenSSH logs: {e}")
         
@@ -515,9 +964,15 @@ class AdvancedSSHDefender:
         if not self.geo_enabled or not self.geoip_reader:
             return None
         
+        # Repeat attackers hit the same IPs, so serve the unpacked dict from the LRU cache
+        with self._cache_lock:
+            if ip in self._geo_cache:
+                self._geo_cache.move_to_end(ip)
+                return self._geo_cache[ip]
+        
         try:
             response = self.geoip_reader.city(ip)
-            return {
+            geo_info = {
                 'country': response.country.name,
                 'country_code': response.country.iso_code,
                 'city': response.city.name,
@@ -527,86 +982,255 @@ class AdvancedSSHDefender:
             }
         except Exception as e:
             logger.debug(f"Error getting geolocation for IP {ip}: {e}")
+            geo_info = None
+        
+        with self._cache_lock:
+            self._geo_cache[ip] = geo_info
+            if len(self._geo_cache) > GEO_CACHE_SIZE:
+                self._geo_cache.popitem(last=False)
+        return geo_info
+    
+    def _ip_details_needed(self):
+        """Whether hostnames and locations of blocked IPs will be shown in an alert or the audit log."""
+        alerts = self.alerts_enabled and (self.slack_enabled or self.email_enabled)
+        return bool(alerts or (self.block_log_path and not self.dry_run))
+    
+    def describe_ip(self, ip):
+        """
+        Look up the hostname and location shown for an IP in logs and alerts.
+        
+        Args:
+            ip: IP address string
+        
+        Returns:
+            tuple: (hostname, location), each "Unknown" if it can't be determined
+        """
+        geo_info = self.get_ip_geo_info(ip) if self.geo_enabled else None
+        hostname = self.get_reverse_dns(ip) or "Unknown"
+        
+        location = "Unknown"
+        if geo_info:
+            city = geo_info.get('city', 'Unknown City')
+            country = geo_info.get('country', 'Unknown Country')
+            location = f"{city}, {country}"
+        
+        return hostname, location
+    
+    def _init_resolver(self):
+        """Create the DNS resolver used for PTR lookups, or None to fall back to the system resolver."""
+        try:
+            resolver = dns.resolver.Resolver()
+            resolver.timeout = RDNS_TIMEOUT
+            resolver.lifetime = RDNS_LIFETIME
+            return resolver
+        except Exception as e:
+            logger.debug(f"Could not configure DNS resolver, using system lookups: {e}")
             return None
     
     def get_reverse_dns(self, ip):
-        """Get reverse DNS information for an IP."""
+        """Get reverse DNS information for an IP, cached for RDNS_CACHE_TTL seconds."""
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._rdns_cache.get(ip)
+            if cached and cached[0] > now:
+                self._rdns_cache.move_to_end(ip)
+                return cached[1]
+        
+        hostname = self._lookup_reverse_dns(ip)
+        self._cache_reverse_dns(ip, hostname, now)
+        return hostname
+    
+    def _lookup_reverse_dns(self, ip):
+        """Resolve the hostname for an IP without consulting the cache; None if it has none."""
         try:
-            hostname = socket.gethostbyaddr(ip)[0]
-            return hostname
+            if self._resolver:
+                # Query the nameservers directly instead of going through nsswitch
+                answer = self._resolver.resolve_address(ip)
+                return str(answer[0]).rstrip('.')
+            return socket.gethostbyaddr(ip)[0]
         except:
             return None
     
+    def _cache_reverse_dns(self, ip, hostname, now):
+        """Store a reverse DNS result, evicting the least recently used entry when full."""
+        # Failed lookups are retried sooner than successful ones
+        ttl = RDNS_CACHE_TTL if hostname else RDNS_NEGATIVE_TTL
+        with self._cache_lock:
+            self._rdns_cache[ip] = (now + ttl, hostname)
+            self._rdns_cache.move_to_end(ip)
+            if len(self._rdns_cache) > RDNS_CACHE_SIZE:
+                self._rdns_cache.popitem(last=False)
+    
+    def resolve_reverse_dns_batch(self, ips):
+        """
+        Warm the reverse DNS cache for several IPs at once.
+        
+        Lookups for IPs without a fresh cache entry run in parallel, so a batch
+        costs roughly one round trip instead of one per IP.
+        
+        Args:
+            ips: Iterable of IP address strings
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            to_resolve = [ip for ip in set(ips)
+                          if ip not in self._rdns_cache or self._rdns_cache[ip][0] <= now]
+        if not to_resolve:
+            return
+        
+        # Only the lookups run in worker threads; the cache is updated here
+        with ThreadPoolExecutor(max_workers=min(RDNS_MAX_WORKERS, len(to_resolve))) as executor:
+            hostnames = list(executor.map(self._lookup_reverse_dns, to_resolve))
+        for ip, hostname in zip(to_resolve, hostnames):
+            self._cache_reverse_dns(ip, hostname, now)
+    
     def block_ip(self, ip, duration_minutes=None):
         """Block an IP address using the system's firewall with expiration time."""
-        if self.is_whitelisted(ip):
-            logger.info(f"Skipping block for whitelisted IP: {ip}")
-            return
+        self.block_ips([ip], duration_minutes)
+    
+    def block_ips(self, ips, duration_minutes=None, ip_info=None):
+        """
+        Block several IP addresses with one firewall update per platform where possible.
         
-        if ip in self.blocked_ips:
-            logger.info(f"IP {ip} is already blocked")
+        Args:
+            ips: Iterable of IP address strings
+            duration_minutes: Block duration, defaults to the configured block_duration
+            ip_info: Optional {ip: (hostname, location)} already looked up, reused for the audit log
+        """
+        to_block = []
+        for ip in dict.fromkeys(ips):
+            if self.is_whitelisted(ip):
+                logger.info(f"Skipping block for whitelisted IP: {ip}")
+            elif ip in self.blocked_ips:
+                logger.info(f"IP {ip} is already blocked")
+            else:
+                to_block.append(ip)
+        
+        if not to_block:
             return
         
         # Calculate expiry time
         if duration_minutes is None:
             duration_minutes = self.block_duration
         
-        expiry_time = datetime.now() + timedelta(minutes=duration_minutes)
-        self.blocked_ips[ip] = expiry_time
+        expiry_time = int(time.time()) + int(duration_minutes * 60)
+        for ip in to_block:
+            self.blocked_ips[ip] = expiry_time
+            heapq.heappush(self._expiry_heap, (expiry_time, ip))
         
         if self.dry_run:
-            logger.info(f"[DRY RUN] Would block IP: {ip} until {expiry_time}")
+            for ip in to_block:
+                logger.info(f"[DRY RUN] Would block IP: {ip} until {datetime.fromtimestamp(expiry_time)}")
             return
         
         # Platform-specific blocking
         if self.platform.startswith('linux'):
-            self._block_ip_linux(ip)
+            self._block_ips_linux(to_block, duration_minutes)
         elif self.platform == 'darwin':
-            self._block_ip_macos(ip)
+            self._block_ips_macos(to_block)
         elif self.platform == 'win32':
-            self._block_ip_windows(ip)
+            self._block_ips_windows(to_block)
         else:
             logger.error(f"Unsupported platform for blocking: {self.platform}")
             return
         
-        # Log the block to audit file
-        self._log_block(ip, expiry_time, duration_minutes)
+        # Log the blocks to audit file
+        self._log_blocks(to_block, expiry_time, duration_minutes, ip_info)
+        
+        # Journal now, persist across reboots with the next flush_state
+        self._journal_state('block', to_block, expiry_time)
+        self._state_dirty = True
+    
+    def _ensure_ipset(self):
+        """Create the blocklist ipset and the iptables rule that drops SSH traffic from it."""
+        if self._ipset_ready:
+            return
+        
+        # "timeout 0" lets each entry carry its own expiry without giving the set a default one
+        subprocess.run(["ipset", "create", IPSET_NAME, "hash:ip", "timeout", "0", "-exist"],
+                       check=True, stderr=subprocess.DEVNULL)
+        rule = ("INPUT", "-m", "set", "--match-set", IPSET_NAME, "src", *IPTABLES_SSH_DROP)
+        if subprocess.run(["iptables", "-C", *rule], stderr=subprocess.DEVNULL).returncode != 0:
+            subprocess.run(["iptables", "-I", *rule], check=True)
+        self._ipset_ready = True
+    
+    def _block_ips_linux(self, ips, duration_minutes):
+        """Block IP addresses on Linux with a single ipset update, falling back to per-IP rules."""
+        try:
+            self._ensure_ipset()
+            timeout = min(int(duration_minutes * 60), IPSET_MAX_TIMEOUT)
+            entries = "".join(f"add {IPSET_NAME} {ip} timeout {timeout}\n" for ip in ips)
+            subprocess.run(["ipset", "restore", "-exist"], input=entries, universal_newlines=True,
+                           check=True, stderr=subprocess.DEVNULL)
+            logger.info(f"Blocked {len(ips)} IP(s) using ipset: {', '.join(ips)}")
+            return
+        except Exception as e:
+            logger.debug(f"Could not block IPs with ipset: {e}")
         
-        # Save state to persist across reboots
-        self._save_state()
+        for ip in ips:
+            self._block_ip_linux(ip, duration_minutes)
     
-    def _block_ip_linux(self, ip):
-        """Block an IP address on Linux using iptables or ufw."""
+    def _block_ip_linux(self, ip, duration_minutes):
+        """Block an IP address on Linux using ipset, falling back to ufw or iptables rules."""
+        try:
+            # Prefer ipset: one O(1) kernel set lookup, and the kernel expires the entry itself
+            self._ensure_ipset()
+            timeout = min(int(duration_minutes * 60), IPSET_MAX_TIMEOUT)
+            subprocess.run(["ipset", "add", IPSET_NAME, ip, "timeout", str(timeout), "-exist"],
+                           check=True, stderr=subprocess.DEVNULL)
+            logger.info(f"Blocked IP {ip} using ipset")
+            return
+        except Exception as e:
+            logger.debug(f"Could not block IP {ip} with ipset: {e}")
+        
         try:
             # Try UFW first (easier to use and more common)
-            ufw_cmd = ["ufw", "deny", f"from {ip}", "to", "any", "port", "22"]
+            ufw_cmd = ["ufw", "deny", f"from {ip}", *UFW_SSH_PORT]
             subprocess.run(ufw_cmd, check=True, stderr=subprocess.DEVNULL)
+            self._rule_blocked_ips.add(ip)
             logger.info(f"Blocked IP {ip} using UFW")
             return
         except Exception:
             # If UFW fails, try iptables
             try:
-                # Check if iptables rule already exists
-                check_cmd = ["iptables", "-C", "INPUT", "-s", ip, "-p", "tcp", "--dport", "22", "-j", "DROP"]
-                result = subprocess.run(check_cmd, stderr=subprocess.DEVNULL)
+                # Check the cached rule list instead of running "iptables -C" per IP
+                installed_rules = self._get_installed_rules()
                 
-                if result.returncode != 0:  # Rule doesn't exist, add it
-                    cmd = ["iptables", "-A", "INPUT", "-s", ip, "-p", "tcp", "--dport", "22", "-j", "DROP"]
+                if ip not in installed_rules:  # Rule doesn't exist, add it
+                    cmd = ["iptables", "-A", "INPUT", "-s", ip, *IPTABLES_SSH_DROP]
                     subprocess.run(cmd, check=True)
+                    installed_rules.add(ip)
                     logger.info(f"Blocked IP {ip} using iptables")
                 else:
                     logger.info(f"IP {ip} is already blocked with iptables")
+                self._rule_blocked_ips.add(ip)
             except Exception as e:
                 try:
                     # Last resort: try nftables
-                    cmd = ["nft", "add", "rule", "inet", "filter", "input", f"ip saddr {ip}", "tcp", "dport", "22", "drop"]
+                    cmd = ["nft", "add", "rule", *NFT_INPUT_CHAIN, f"ip saddr {ip}", *NFT_SSH_DROP]
                     subprocess.run(cmd, check=True)
+                    self._rule_blocked_ips.add(ip)
                     logger.info(f"Blocked IP {ip} using nftables")
                 except Exception as e2:
                     logger.error(f"Failed to block IP {ip}: {e2}")
     
-    def _block_ip_macos(self, ip):
-        """Block an IP address on macOS using the pf firewall."""
+    def _get_installed_rules(self):
+        """
+        Get the IPs that already have a per-IP iptables drop rule.
+        
+        The INPUT chain is listed once and the set is kept up to date as rules
+        are added and removed.
+        
+        Returns:
+            set: IP address strings
+        """
+        if self._installed_rules is None:
+            output = subprocess.check_output(["iptables", "-S", "INPUT"], universal_newlines=True)
+            self._installed_rules = set(IPTABLES_DROP_RULE_PATTERN.findall(output))
+        return self._installed_rules
+    
+    def _block_ips_macos(self, ips):
+        """Block IP addresses on macOS by adding them all to the pf table in one pfctl call."""
         try:
             # Create or append to a table for blocked IPs
             pf_table = "/etc/pf.anchors/sshdefender"
@@ -621,39 +1245,36 @@ class AdvancedSSHDefender:
                 subprocess.run(["pfctl", "-e"], stderr=subprocess.DEVNULL)
                 subprocess.run(["pfctl", "-a", "sshdefender", "-f", pf_table], check=True)
             
-            # Add the IP to the table
-            subprocess.run(["pfctl", "-t", "sshblocklist", "-T", "add", ip], check=True)
-            logger.info(f"Blocked IP {ip} using pf firewall")
+            # Add the IPs to the table, read one per line from stdin
+            subprocess.run(["pfctl", "-t", "sshblocklist", "-T", "add", "-f", "-"],
+                           input="\n".join(ips) + "\n", universal_newlines=True, check=True)
+            logger.info(f"Blocked {len(ips)} IP(s) using pf firewall: {', '.join(ips)}")
         except Exception as e:
-            logger.error(f"Failed to block IP {ip}: {e}")
+            logger.error(f"Failed to block IPs {', '.join(ips)}: {e}")
     
-        def _block_ip_windows(self, ip):
-        """Block an IP address on Windows using Windows Firewall."""
+    def _block_ips_windows(self, ips):
+        """Block IP addresses on Windows with one PowerShell script that adds any missing firewall rules."""
         try:
-            # Create a firewall rule to block the IP
-            rule_name = f"SSH Defender - Block {ip}"
-            
-            # Check if rule already exists
-            check_cmd = [
-                "powershell",
-                "-Command",
-                f"Get-NetFirewallRule -DisplayName '{rule_name}' 2>$null"
-            ]
-            result = subprocess.run(check_cmd, stdout=subprocess.PIPE)
-            
-            if not result.stdout.strip():  # Rule doesn't exist
-                cmd = [
-                    "powershell",
-                    "-Command",
-                    f"New-NetFirewallRule -DisplayName '{rule_name}' -Direction Inbound -Action Block "
-                    f"-RemoteAddress {ip} -Protocol TCP -LocalPort 22 -Enabled True"
-                ]
-                subprocess.run(cmd, check=True)
-                logger.info(f"Blocked IP {ip} using Windows Firewall")
-            else:
-                logger.info(f"IP {ip} is already blocked with Windows Firewall")
+            ip_list = ", ".join(f"'{ip}'" for ip in ips)
+            script = (
+                f"foreach ($ip in @({ip_list})) {{ "
+                "$name = \"SSH Defender - Block $ip\"; "
+                f"if (-not (Get-NetFirewallRule -DisplayName $name -ErrorAction SilentlyContinue)) {{ "
+                "New-NetFirewallRule -DisplayName $name -Direction Inbound -Action Block "
+                "-RemoteAddress $ip -Protocol TCP -LocalPort 22 -Enabled True | Out-Null "
+                f"}} }}"
+            )
+            # Pass the script on stdin so a long IP list cannot hit the command-line length limit
+            subprocess.run(["powershell", "-NoProfile", "-Command", "-"],
+                           input=script + "\n", universal_newlines=True, check=True)
+            logger.info(f"Blocked {len(ips)} IP(s) using Windows Firewall: {', '.join(ips)}")
         except Exception as e:
-            logger.error(f"Failed to block IP {ip}: {e}")
+            logger.error(f"Failed to block IPs {', '.join(ips)}: {e}")
+    
+    def _block_ip_windows(self, ip):
+        """Block an IP address on Windows using Windows Firewall."""
+        # A single PowerShell run checks for and creates the rule
+        self._block_ips_windows([ip])
     
     def unblock_ip(self, ip):
         """Unblock an IP address."""
@@ -661,169 +1282,312 @@ class AdvancedSSHDefender:
             logger.info(f"IP {ip} is not in the block list")
             return
         
+        self.unblock_ips([ip])
+    
+    def unblock_ips(self, ips):
+        """
+        Unblock several IP addresses with one firewall update per platform where possible.
+        
+        Args:
+            ips: Iterable of IP address strings; IPs that are not blocked are ignored
+        """
+        to_unblock = [ip for ip in dict.fromkeys(ips) if ip in self.blocked_ips]
+        if not to_unblock:
+            return
+        
+        # Clusters containing these IPs are alerted on again if they are blocked again
+        for username in [username for username, reported in self._last_reported.items()
+                         if not reported.isdisjoint(to_unblock)]:
+            del self._last_reported[username]
+        
         if self.dry_run:
-            logger.info(f"[DRY RUN] Would unblock IP: {ip}")
-            del self.blocked_ips[ip]
+            for ip in to_unblock:
+                logger.info(f"[DRY RUN] Would unblock IP: {ip}")
+                del self.blocked_ips[ip]
             return
         
         # Platform-specific unblocking
         if self.platform.startswith('linux'):
-            self._unblock_ip_linux(ip)
+            self._unblock_ips_linux(to_unblock)
         elif self.platform == 'darwin':
-            self._unblock_ip_macos(ip)
+            self._unblock_ips_macos(to_unblock)
         elif self.platform == 'win32':
-            self._unblock_ip_windows(ip)
+            self._unblock_ips_windows(to_unblock)
         else:
             logger.error(f"Unsupported platform for unblocking: {self.platform}")
             return
         
         # Remove from blocked IPs
-        del self.blocked_ips[ip]
+        for ip in to_unblock:
+            del self.blocked_ips[ip]
         
-        # Log the unblock
-        self._log_unblock(ip)
+        # Log the unblocks
+        self._log_unblocks(to_unblock)
         
-        # Save state
-        self._save_state()
+        # Journal now, persist with the next flush_state
+        self._journal_state('unblock', to_unblock)
+        self._state_dirty = True
+    
+    def _unblock_ips_linux(self, ips):
+        """
+        Unblock IP addresses on Linux with a single ipset or iptables-restore update where possible.
+        
+        IPs recorded as blocked with per-IP rules (the fallback when the ipset is
+        unusable, or blocks loaded from older state files), and any IP with a per-IP
+        iptables drop rule, have those rules removed too, batched through iptables-restore.
+        """
+        # Also catch per-IP iptables drop rules for the IPs that were never recorded
+        try:
+            installed_rules = self._get_installed_rules()
+        except Exception as e:
+            logger.debug(f"Could not list iptables rules: {e}")
+            installed_rules = set()
+        rule_ips = [ip for ip in ips if ip in self._rule_blocked_ips or ip in installed_rules]
+        self._rule_blocked_ips.difference_update(ips)
+        try:
+            # Entries may already have timed out; "-exist" ignores those
+            self._ensure_ipset()
+            set_ips = [ip for ip in ips if ip not in rule_ips]
+            entries = "".join(f"del {IPSET_NAME} {ip}\n" for ip in ips)
+            subprocess.run(["ipset", "restore", "-exist"], input=entries, universal_newlines=True,
+                           check=True, stderr=subprocess.DEVNULL)
+            if set_ips:
+                logger.info(f"Unblocked {len(set_ips)} IP(s) using ipset: {', '.join(set_ips)}")
+            ips = rule_ips
+        except Exception as e:
+            # Without a usable ipset every block must be a per-IP rule
+            logger.debug(f"Could not unblock IPs with ipset: {e}")
+        
+        if not ips:
+            return
+        
+        remaining = ips
+        try:
+            # Remove all per-IP iptables rules in one atomic iptables-restore commit
+            installed_rules = self._get_installed_rules()
+            iptables_ips = [ip for ip in ips if ip in installed_rules]
+            if iptables_ips:
+                rule_match = " ".join(IPTABLES_SSH_DROP)
+                script = "*filter\n" + "".join(
+                    f"-D INPUT -s {ip}/32 {rule_match}\n" for ip in iptables_ips) + "COMMIT\n"
+                subprocess.run(["iptables-restore", "--noflush"], input=script, universal_newlines=True, check=True)
+                logger.info(f"Unblocked {len(iptables_ips)} IP(s) using iptables: {', '.join(iptables_ips)}")
+                remaining = [ip for ip in ips if ip not in installed_rules]
+                installed_rules.difference_update(iptables_ips)
+        except Exception as e:
+            logger.debug(f"Could not unblock IPs with iptables-restore: {e}")
+        
+        for ip in remaining:
+            self._unblock_ip_linux(ip)
     
     def _unblock_ip_linux(self, ip):
-        """Unblock an IP address on Linux."""
+        """Unblock an IP address on Linux that was blocked with ufw, iptables or nftables rules."""
         try:
             # Try UFW first
-            ufw_cmd = ["ufw", "delete", "deny", f"from {ip}", "to", "any", "port", "22"]
+            ufw_cmd = ["ufw", "delete", "deny", f"from {ip}", *UFW_SSH_PORT]
             subprocess.run(ufw_cmd, check=True, stderr=subprocess.DEVNULL)
             logger.info(f"Unblocked IP {ip} using UFW")
             return
         except Exception:
             # If UFW fails, try iptables
             try:
-                cmd = ["iptables", "-D", "INPUT", "-s", ip, "-p", "tcp", "--dport", "22", "-j", "DROP"]
+                cmd = ["iptables", "-D", "INPUT", "-s", ip, *IPTABLES_SSH_DROP]
                 subprocess.run(cmd, check=True)
+                if self._installed_rules is not None:
+                    self._installed_rules.discard(ip)
                 logger.info(f"Unblocked IP {ip} using iptables")
             except Exception as e:
                 try:
                     # Last resort: try nftables
-                    cmd = ["nft", "delete", "rule", "inet", "filter", "input", f"ip saddr {ip}", "tcp", "dport", "22", "drop"]
+                    cmd = ["nft", "delete", "rule", *NFT_INPUT_CHAIN, f"ip saddr {ip}", *NFT_SSH_DROP]
                     subprocess.run(cmd, check=True)
                     logger.info(f"Unblocked IP {ip} using nftables")
                 except Exception as e2:
                     logger.error(f"Failed to unblock IP {ip}: {e2}")
     
-    def _unblock_ip_macos(self, ip):
-        """Unblock an IP address on macOS."""
+    def _unblock_ips_macos(self, ips):
+        """Unblock IP addresses on macOS by removing them from the pf table in one pfctl call."""
         try:
-            # Remove the IP from the pf table
-            subprocess.run(["pfctl", "-t", "sshblocklist", "-T", "delete", ip], check=True)
-            logger.info(f"Unblocked IP {ip} using pf firewall")
+            # Remove the IPs from the pf table, read one per line from stdin
+            subprocess.run(["pfctl", "-t", "sshblocklist", "-T", "delete", "-f", "-"],
+                           input="\n".join(ips) + "\n", universal_newlines=True, check=True)
+            logger.info(f"Unblocked {len(ips)} IP(s) using pf firewall: {', '.join(ips)}")
         except Exception as e:
-            logger.error(f"Failed to unblock IP {ip}: {e}")
+            logger.error(f"Failed to unblock IPs {', '.join(ips)}: {e}")
     
-    def _unblock_ip_windows(self, ip):
-        """Unblock an IP address on Windows."""
-        try:
-            # Remove the firewall rule
-            rule_name = f"SSH Defender - Block {ip}"
-            cmd = [
-                "powershell",
-                "-Command",
-                f"Remove-NetFirewallRule -DisplayName '{rule_name}' -ErrorAction SilentlyContinue"
-            ]
-            subprocess.run(cmd, check=True)
-            logger.info(f"Unblocked IP {ip} using Windows Firewall")
-        except Exception as e:
-            logger.error(f"Failed to unblock IP {ip}: {e}")
+    def _unblock_ips_windows(self, ips):
+        """
+        Unblock IP addresses on Windows by removing their firewall rules.
+        
+        Rules are removed through the firewall COM interface when pywin32 is
+        available, otherwise with netsh, which starts far faster than PowerShell.
+        """
+        if WIN32COM_AVAILABLE:
+            try:
+                rules = win32com.client.Dispatch("HNetCfg.FwPolicy2").Rules
+                for ip in ips:
+                    rules.Remove(f"SSH Defender - Block {ip}")
+                logger.info(f"Unblocked {len(ips)} IP(s) using Windows Firewall: {', '.join(ips)}")
+                return
+            except Exception as e:
+                logger.debug(f"Firewall COM interface failed, falling back to netsh: {e}")
+        
+        # Rules already removed before a COM failure just make netsh report no match
+        for ip in ips:
+            try:
+                result = subprocess.run(["netsh", "advfirewall", "firewall", "delete", "rule",
+                                         f"name=SSH Defender - Block {ip}"],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        universal_newlines=True)
+                if result.returncode != 0:
+                    logger.debug(f"netsh found no firewall rule for {ip}: {result.stdout.strip()}")
+                logger.info(f"Unblocked IP {ip} using Windows Firewall")
+            except Exception as e:
+                logger.error(f"Failed to unblock IP {ip}: {e}")
     
-    def _log_block(self, ip, expiry_time, duration_minutes):
-        """Log block action to the audit file."""
-        if not hasattr(self, 'block_log_path') or not self.block_log_path:
+    def _log_blocks(self, ips, expiry_time, duration_minutes, ip_info=None):
+        """Log block actions to the audit file with a single write, reusing any looked-up IP details."""
+        if not self.block_log_path:
             return
         
         try:
-            # Create directory if it doesn't exist
-            log_dir = os.path.dirname(self.block_log_path)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            geo_info = self.get_ip_geo_info(ip) if self.geo_enabled else None
-            hostname = self.get_reverse_dns(ip) or "Unknown"
-            
-            location = "Unknown"
-            if geo_info:
-                city = geo_info.get('city', 'Unknown City')
-                country = geo_info.get('country', 'Unknown Country')
-                location = f"{city}, {country}"
-            
-            log_entry = (
-                f"{timestamp} - BLOCK - IP: {ip} - Hostname: {hostname} - "
-                f"Location: {location} - Duration: {duration_minutes} min - "
-                f"Expires: {expiry_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            )
+            timestamp = format_timestamp()
+            expires = format_timestamp(expiry_time)
+            log_entries = []
+            for ip in ips:
+                hostname, location = (ip_info or {}).get(ip) or self.describe_ip(ip)
+                
+                log_entries.append(
+                    f"{timestamp} - BLOCK - IP: {ip} - Hostname: {hostname} - "
+                    f"Location: {location} - Duration: {duration_minutes} min - "
+                    f"Expires: {expires}\n"
+                )
             
-            with open(self.block_log_path, 'a') as f:
-                f.write(log_entry)
+            self._get_audit_logger().enqueue("".join(log_entries))
         except Exception as e:
             logger.error(f"Failed to log block to audit file: {e}")
     
-    def _log_unblock(self, ip):
-        """Log unblock action to the audit file."""
-        if not hasattr(self, 'block_log_path') or not self.block_log_path:
+    def _get_audit_logger(self):
+        """Get the audit log writer, starting it on first use."""
+        if self._audit_logger is None:
+            self._audit_logger = _AuditLogger(self.block_log_path)
+        return self._audit_logger
+    
+    def _log_unblocks(self, ips):
+        """Log unblock actions to the audit file with a single write."""
+        if not self.block_log_path:
             return
         
         try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_entry = f"{timestamp} - UNBLOCK - IP: {ip}\n"
+            timestamp = format_timestamp()
+            log_entries = "".join(f"{timestamp} - UNBLOCK - IP: {ip}\n" for ip in ips)
             
-            with open(self.block_log_path, 'a') as f:
-                f.write(log_entry)
+            self._get_audit_logger().enqueue(log_entries)
         except Exception as e:
             logger.error(f"Failed to log unblock to audit file: {e}")
     
     def check_expired_blocks(self):
         """Check for and remove expired IP blocks."""
-        now = datetime.now()
-        expired_ips = [ip for ip, expiry in self.blocked_ips.items() if expiry <= now]
+        now = time.time()
+        expired_ips = []
         
-        for ip in expired_ips:
-            logger.info(f"Block for IP {ip} has expired, removing")
-            self.unblock_ip(ip)
+        # Pop only the blocks due by now instead of scanning every blocked IP
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expiry, ip = heapq.heappop(self._expiry_heap)
+            if self.blocked_ips.get(ip) == expiry:  # Skip entries for IPs already unblocked
+                logger.info(f"Block for IP {ip} has expired, removing")
+                expired_ips.append(ip)
+        
+        # Remove all expired blocks in one firewall update
+        self.unblock_ips(expired_ips)
     
-    def detect_distributed_attacks(self):
-        """Detect distributed SSH attacks based on patterns."""
+    def _track_user_target(self, username, ip, timestamp):
+        """
+        Record that an IP targeted a username, keeping at most USER_TARGETS_MAX usernames.
+        
+        Args:
+            username: Targeted account name
+            ip: Source IP address
+            timestamp: Time of the failed attempt
+        """
+        targets = self.user_targets.pop(username, None) or {}
+        self._user_targets_dirty.add(username)
+        if targets.get(ip, timestamp) <= timestamp:
+            targets[ip] = timestamp
+        
+        # Re-insert as most recently targeted and evict the stalest username
+        self.user_targets[username] = targets
+        if len(self.user_targets) > USER_TARGETS_MAX:
+            evicted, _ = self.user_targets.popitem(last=False)
+            self._last_reported.pop(evicted, None)
+    
+    def detect_distributed_attacks(self, resolve_ips=()):
+        """
+        Detect distributed SSH attacks based on patterns.
+        
+        Only usernames targeted since the last call are examined, so a cluster is
+        detected again whenever its IPs keep attacking, e.g. after their blocks expire.
+        
+        Args:
+            resolve_ips: Other IPs whose hostnames are needed soon, resolved in the
+                same parallel batch as the attacking IPs
+        
+        Returns:
+            list: Detected attacks
+        """
         now = datetime.now()
         window_start = now - timedelta(minutes=60)  # Look at the last hour
         results = []
         
+        dirty_usernames = self._user_targets_dirty
+        self._user_targets_dirty = set()
+        
         # Check for username-based clustering
-        for username, ips in self.user_targets.items():
-            if len(ips) >= self.username_threshold:
-                logger.warning(f"Detected distributed attack targeting user '{username}' from {len(ips)} different IPs")
-                
-                # Get more details about the attacking IPs
-                ip_details = []
-                for ip in ips:
-                    geo_info = self.get_ip_geo_info(ip) if self.geo_enabled else None
-                    hostname = self.get_reverse_dns(ip) or "Unknown"
-                    
-                    location = "Unknown"
-                    if geo_info:
-                        city = geo_info.get('city', 'Unknown City')
-                        country = geo_info.get('country', 'Unknown Country')
-                        location = f"{city}, {country}"
-                    
-                    ip_details.append({
-                        'ip': ip,
-                        'hostname': hostname,
-                        'location': location,
-                        'target': username
-                    })
-                
-                results.append({
-                    'type': 'username_cluster',
-                    'username': username,
-                    'ips': ips,
-                    'ip_details': ip_details
+        clusters = []
+        for username in dirty_usernames:
+            targets = self.user_targets.get(username)
+            if targets is None:  # Evicted since it was marked
+                continue
+            
+            # Forget IPs that have not targeted the username within the window
+            for ip in [ip for ip, last_seen in targets.items() if last_seen < window_start]:
+                del targets[ip]
+            if not targets:
+                del self.user_targets[username]
+                self._last_reported.pop(username, None)
+                continue
+            
+            if len(targets) >= self.username_threshold:
+                clusters.append((username, list(targets)))
+        
+        # Resolve hostnames for every attacking IP at once before building the details,
+        # unless no alert or audit log entry will show them
+        describe = self._ip_details_needed()
+        if describe:
+            self.resolve_reverse_dns_batch([ip for _, ips in clusters for ip in ips] + list(resolve_ips))
+        else:
+            self.resolve_reverse_dns_batch(resolve_ips)
+        
+        for username, ips in clusters:
+            logger.warning(f"Detected distributed attack targeting user '{username}' from {len(ips)} different IPs")
+            
+            # Get more details about the attacking IPs
+            ip_details = []
+            for ip in ips:
+                hostname, location = self.describe_ip(ip) if describe else ("Unknown", "Unknown")
+                ip_details.append({
+                    'ip': ip,
+                    'hostname': hostname,
+                    'location': location,
+                    'target': username
                 })
+            
+            results.append({
+                'type': 'username_cluster',
+                'username': username,
+                'ips': ips,
+                'ip_details': ip_details
+            })
         
         # TODO: Add more distributed attack detection methods
         # - Timing patterns
@@ -832,26 +1596,16 @@ class AdvancedSSHDefender:
         
         return results
     
-    def send_slack_alert(self, ip, attempts_count, is_distributed=False, distributed_info=None):
-        """Send a Slack alert about blocked IP."""
-        if not hasattr(self, 'slack_enabled') or not self.slack_enabled or not self.alerts_enabled:
+    def send_slack_alert(self, ip, attempts_count, is_distributed=False, distributed_info=None, ip_info=None):
+        """Send a Slack alert about blocked IP, reusing its (hostname, location) from ip_info if given."""
+        if not self.slack_enabled or not self.alerts_enabled:
             return
         
-        if not hasattr(self, 'slack_webhook') or not self.slack_webhook:
+        if not self.slack_webhook:
             logger.warning("Slack webhook URL not configured, can't send alert")
             return
         
         try:
-            # Get additional info about the IP
-            geo_info = self.get_ip_geo_info(ip) if self.geo_enabled else None
-            hostname = self.get_reverse_dns(ip) or "Unknown"
-            
-            location = "Unknown"
-            if geo_info:
-                city = geo_info.get('city', 'Unknown City')
-                country = geo_info.get('country', 'Unknown Country')
-                location = f"{city}, {country}"
-            
             # Format message based on whether it's a distributed attack or not
             if is_distributed:
                 title = ":rotating_light: *DISTRIBUTED SSH ATTACK DETECTED* :rotating_light:"
@@ -892,6 +1646,7 @@ class AdvancedSSHDefender:
                     "short": False
                 })
             else:
+                hostname, location = ip_info or self.describe_ip(ip)
                 title = ":lock: *SSH BRUTE-FORCE ATTEMPT BLOCKED* :lock:"
                 fields = [
                     {
@@ -917,31 +1672,26 @@ class AdvancedSSHDefender:
                 ]
                 
                 # Add expiry info if available
-                if ip in self.blocked_ips:
-                    expiry = self.blocked_ips[ip]
+                expiry = self.blocked_ips.get(ip)
+                if expiry is not None:
                     fields.append({
                         "title": "Blocked Until",
-                        "value": expiry.strftime("%Y-%m-%d %H:%M:%S"),
+                        "value": format_timestamp(expiry),
                         "short": True
                     })
             
-            # Create the message payload
-            payload = {
-                "text": title,
-                "attachments": [
-                    {
-                        "color": "#FF0000" if is_distributed else "#FFA500",
-                        "fields": fields,
-                        "footer": "SSH Defender",
-                        "footer_icon": "https://platform.slack-edge.com/img/default_application_icon.png",
-                        "ts": int(time.time())
-                    }
-                ]
+            # Create the message attachment
+            attachment = {
+                "color": "#FF0000" if is_distributed else "#FFA500",
+                "fields": fields,
+                **SLACK_ATTACHMENT_FOOTER,
+                "ts": int(time.time())
             }
             
-            # Send to Slack
-            webhook = WebhookClient(self.slack_webhook)
-            response = webhook.send(json.dumps(payload))
+            # Send to Slack, reusing one client across alerts; the client serializes the payload
+            if self._slack_client is None:
+                self._slack_client = WebhookClient(self.slack_webhook)
+            response = self._slack_client.send(text=title, attachments=[attachment])
             
             if response.status_code != 200:
                 logger.error(f"Failed to send Slack alert: {response.body}")
@@ -951,26 +1701,16 @@ class AdvancedSSHDefender:
         except Exception as e:
             logger.error(f"Error sending Slack alert: {e}")
     
-    def send_email_alert(self, ip, attempts_count, username, is_distributed=False, distributed_info=None):
-        """Send an email alert about blocked IP."""
-        if not hasattr(self, 'email_enabled') or not self.email_enabled or not self.alerts_enabled:
+    def send_email_alert(self, ip, attempts_count, username, is_distributed=False, distributed_info=None, ip_info=None):
+        """Send an email alert about blocked IP, reusing its (hostname, location) from ip_info if given."""
+        if not self.email_enabled or not self.alerts_enabled:
             return
         
-        if not all([hasattr(self, attr) for attr in ['smtp_server', 'smtp_port', 'smtp_username', 'smtp_password', 'email_from', 'email_to']]):
+        if not (self.smtp_server and self.smtp_port and self.smtp_username and self.email_from and self.email_to):
             logger.warning("Email configuration incomplete, can't send alert")
             return
         
         try:
-            # Get additional info about the IP
-            geo_info = self.get_ip_geo_info(ip) if self.geo_enabled else None
-            hostname = self.get_reverse_dns(ip) or "Unknown"
-            
-            location = "Unknown"
-            if geo_info:
-                city = geo_info.get('city', 'Unknown City')
-                country = geo_info.get('country', 'Unknown Country')
-                location = f"{city}, {country}"
-            
             # Create the email message
             msg = MIMEMultipart('alternative')
             
@@ -990,55 +1730,66 @@ class AdvancedSSHDefender:
                         'pattern': f"From {ip_detail['location']}"
                     })
                 
-                # Create HTML version from template
-                html = HTML_EMAIL_TEMPLATE.replace("{{ header_color }}", header_color)
-                html = html.replace("{{ alert_type }}", alert_type)
-                html = html.replace("{{ message }}", message)
-                html = html.replace("{{ ip }}", "Multiple (see below)")
-                html = html.replace("{{ hostname }}", "Multiple")
-                html = html.replace("{{ location }}", "Multiple Locations")
-                html = html.replace("{{ attempts }}", "Multiple")
-                html = html.replace("{{ time_period }}", "Last 60 minutes")
-                html = html.replace("{{ users }}", distributed_info.get('username', 'Unknown'))
-                html = html.replace("{{ action }}", action)
-                html = html.replace("{{ timestamp }}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                html = html.replace("{{ is_distributed }}", "true")
+                # Values for the template placeholders
+                template_values = {
+                    'header_color': header_color,
+                    'alert_type': alert_type,
+                    'message': message,
+                    'ip': "Multiple (see below)",
+                    'hostname': "Multiple",
+                    'location': "Multiple Locations",
+                    'attempts': "Multiple",
+                    'time_period': "Last 60 minutes",
+                    'users': distributed_info.get('username', 'Unknown'),
+                    'action': action,
+                    'timestamp': format_timestamp(),
+                    'is_distributed': "true"
+                }
                 
                 # Add related IPs to the template
-                related_ips_html = ""
-                for i, ip_info in enumerate(related_ips):
-                    related_ips_html += f'<tr><td>{ip_info["ip"]}</td><td>{ip_info["target"]}</td><td>{ip_info["pattern"]}</td></tr>\n'
-                
-                html = html.replace("{% for ip_info in related_ips %}\n                <tr><td>{{ ip_info.ip }}</td><td>{{ ip_info.target }}</td><td>{{ ip_info.pattern }}</td></tr>\n                {% endfor %}", related_ips_html)
+                related_ips_html = "\n".join(
+                    f'<tr><td>{related["ip"]}</td><td>{related["target"]}</td><td>{related["pattern"]}</td></tr>'
+                    for related in related_ips)
+                html = EMAIL_LOOP_PATTERN.sub(lambda match: related_ips_html, HTML_EMAIL_TEMPLATE)
                 
             else:
+                hostname, location = ip_info or self.describe_ip(ip)
                 msg['Subject'] = f"SECURITY ALERT: SSH Brute-Force Attempt from {ip}"
                 alert_type = "Alert"
                 header_color = "FFA500"  # Orange for regular alerts
                 message = f"An SSH brute-force attempt has been detected and blocked. The attacker made {attempts_count} failed login attempts."
                 action = f"IP {ip} has been blocked for {self.block_duration} minutes."
                 
-                if ip in self.blocked_ips:
-                    unblock_info = f"Block will expire automatically at {self.blocked_ips[ip].strftime('%Y-%m-%d %H:%M:%S')}."
+                expiry = self.blocked_ips.get(ip)
+                if expiry is not None:
+                    unblock_info = f"Block will expire automatically at {format_timestamp(expiry)}."
                 else:
                     unblock_info = ""
                 
-                # Create HTML version from template
-                html = HTML_EMAIL_TEMPLATE.replace("{{ header_color }}", header_color)
-                html = html.replace("{{ alert_type }}", alert_type)
-                html = html.replace("{{ message }}", message)
-                html = html.replace("{{ ip }}", ip)
-                html = html.replace("{{ hostname }}", hostname)
-                html = html.replace("{{ location }}", location)
-                html = html.replace("{{ attempts }}", str(attempts_count))
-                html = html.replace("{{ time_period }}", f"Last {self.time_window} minutes")
-                html = html.replace("{{ users }}", username or "Unknown")
-                html = html.replace("{{ action }}", action)
-                html = html.replace("{{ unblock_info }}", unblock_info)
-                html = html.replace("{{ timestamp }}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                # Values for the template placeholders
+                template_values = {
+                    'header_color': header_color,
+                    'alert_type': alert_type,
+                    'message': message,
+                    'ip': ip,
+                    'hostname': hostname,
+                    'location': location,
+                    'attempts': str(attempts_count),
+                    'time_period': f"Last {self.time_window} minutes",
+                    'users': username or "Unknown",
+                    'action': action,
+                    'unblock_info': unblock_info,
+                    'timestamp': format_timestamp()
+                }
                 
-                # Remove distributed attack section
-                html = html.replace("{% if is_distributed %}\n            <h3>Distributed Attack Information:</h3>\n            <p>This appears to be part of a coordinated attack from multiple sources.</p>\n            <table>\n                <tr><th>Related IPs</th><th>Common Target</th><th>Pattern</th></tr>\n                {% for ip_info in related_ips %}\n                <tr><td>{{ ip_info.ip }}</td><td>{{ ip_info.target }}</td><td>{{ ip_info.pattern }}</td></tr>\n                {% endfor %}\n            </table>\n            {% endif %}", "")
+                html = HTML_EMAIL_TEMPLATE
+            
+            # Keep conditional sections whose value is set, e.g. the distributed attack section
+            html = EMAIL_CONDITIONAL_PATTERN.sub(
+                lambda match: match.group(2) if template_values.get(match.group(1)) else "", html)
+            
+            # Fill every placeholder in one pass; unset ones render empty
+            html = EMAIL_PLACEHOLDER_PATTERN.sub(lambda match: template_values.get(match.group(1), ""), html)
             
             # Attach HTML part
             part = MIMEText(html, 'html')
@@ -1048,18 +1799,73 @@ class AdvancedSSHDefender:
             msg['From'] = self.email_from
             msg['To'] = ", ".join(self.email_to)
             
-            # Connect to SMTP server and send
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                if self.smtp_use_tls:
-                    server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            self._send_email(msg)
             
             logger.info("Email alert sent successfully")
             
         except Exception as e:
             logger.error(f"Error sending email alert: {e}")
     
+    def _connect_smtp(self):
+        """Open a new SMTP connection, upgraded to TLS if configured, and log in."""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        if self.smtp_use_tls:
+            server.starttls()
+        server.login(self.smtp_username, self.smtp_password)
+        return server
+    
+    def _send_email(self, msg):
+        """
+        Send a message over the shared SMTP connection, reconnecting once if the server dropped it.
+        
+        Args:
+            msg: Email message to send
+        """
+        with self._smtp_lock:
+            if self._smtp is None:
+                self._smtp = self._connect_smtp()
+            else:
+                try:
+                    self._smtp.send_message(msg)
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    # Servers close idle connections, so reconnect and retry once
+                    logger.debug(f"SMTP connection lost, reconnecting: {e}")
+                    self._smtp.close()
+                    self._smtp = None
+                    self._smtp = self._connect_smtp()
+            
+            self._smtp.send_message(msg)
+    
+    def close_smtp(self):
+        """Close the shared SMTP connection if one is open."""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception as e:
+                    logger.debug(f"Error closing SMTP connection: {e}")
+                self._smtp = None
+    
+    def _dispatch_alert(self, send, *args, **kwargs):
+        """
+        Send an alert from the alert thread pool so slow webhooks and SMTP servers don't stall monitoring.
+        
+        Args:
+            send: Alert method to call, e.g. send_slack_alert
+            *args: Arguments for the alert method
+            **kwargs: Keyword arguments for the alert method
+        """
+        # Drop the alert rather than queue without bound when sending can't keep up
+        if not self._alert_slots.acquire(blocking=False):
+            logger.warning(f"Alert backlog full, dropping {send.__name__} alert for {args[0]}")
+            return
+        
+        if self._alert_pool is None:
+            self._alert_pool = ThreadPoolExecutor(max_workers=ALERT_MAX_WORKERS, thread_name_prefix="alert")
+        future = self._alert_pool.submit(send, *args, **kwargs)
+        future.add_done_callback(lambda _: self._alert_slots.release())
+    
     def process_attempts(self):
         """Process failed login attempts and block IPs that exceed the threshold."""
         # Check for and remove expired blocks
@@ -1068,8 +1874,8 @@ class AdvancedSSHDefender:
         # Get recent failed attempts
         attempts = self.get_failed_attempts()
         
-        # If no logs found, notify user
-        if not attempts:
+        # If no logs found and nothing is being tracked, notify user
+        if not attempts and not self.failed_attempts:
             logger.warning("No SSH login attempts found in logs. Make sure the SSH service is running and logging is enabled.")
             if self.platform == 'win32':
                 logger.info("On Windows, ensure OpenSSH Server is installed as an optional feature.")
@@ -1079,53 +1885,80 @@ class AdvancedSSHDefender:
         now = datetime.now()
         window_start = now - timedelta(minutes=self.time_window)
         
-        # Update failed attempts dictionary and user targets
+        # Update failed attempts dictionary and user targets, keeping each IP's attempts sorted
         for timestamp, ip, username in attempts:
             if timestamp >= window_start:
-                self.failed_attempts[ip].append((timestamp, username))
+                ip_attempts = self.failed_attempts[ip]
+                if ip_attempts and timestamp < ip_attempts[-1][0]:
+                    bisect.insort(ip_attempts, (timestamp, username))
+                else:
+                    ip_attempts.append((timestamp, username))
                 if username:  # Track for distributed attack detection
-                    self.user_targets[username].add(ip)
+                    self._track_user_target(username, ip, timestamp)
         
         # Check for IPs that exceed the threshold
-        for ip, attempts_data in self.failed_attempts.items():
-            # Only consider attempts within the time window
-            recent_attempts = [data for data in attempts_data if data[0] >= window_start]
+        offenders = []
+        for ip in list(self.failed_attempts):
+            # Drop attempts that have fallen out of the time window
+            recent_attempts = self.failed_attempts[ip]
+            while recent_attempts and recent_attempts[0][0] < window_start:
+                recent_attempts.popleft()
+            if not recent_attempts:
+                del self.failed_attempts[ip]
+                continue
             
             if len(recent_attempts) >= self.threshold and ip not in self.blocked_ips and not self.is_whitelisted(ip):
                 logger.warning(f"IP {ip} exceeded threshold with {len(recent_attempts)} failed attempts in the last {self.time_window} minutes")
-                
-                # Get the usernames targeted
-                usernames = set(data[1] for data in recent_attempts if data[1])
-                username_str = ", ".join(usernames) if usernames else "Unknown"
-                
-                # Block the IP
-                self.block_ip(ip)
-                
-                # Send alerts
-                if self.alerts_enabled:
-                    if hasattr(self, 'slack_enabled') and self.slack_enabled:
-                        self.send_slack_alert(ip, len(recent_attempts))
-                    
-                    if hasattr(self, 'email_enabled') and self.email_enabled:
-                        self.send_email_alert(ip, len(recent_attempts), username_str)
+                offenders.append((ip, recent_attempts))
         
-        # Check for distributed attacks if enabled
+        # Resolve hostnames for all offenders up front rather than one at a time while blocking,
+        # in the same parallel batch as any distributed attack IPs. Skip the lookups when
+        # nothing will show them; in dry-run mode alerts look up details themselves
+        offender_ips = [ip for ip, _ in offenders]
+        describe = self._ip_details_needed() and not self.dry_run
+        resolve_ips = offender_ips if describe else []
         if self.distributed_detection:
-            distributed_attacks = self.detect_distributed_attacks()
-            
+            distributed_attacks = self.detect_distributed_attacks(resolve_ips=resolve_ips)
+        else:
+            distributed_attacks = []
+            self.resolve_reverse_dns_batch(resolve_ips)
+        
+        # Look up each blocked IP's details once for the audit log and alerts
+        ip_info = {ip: self.describe_ip(ip) for ip in resolve_ips}
+        if describe:
             for attack in distributed_attacks:
-                # Send alerts for distributed attacks
-                if self.alerts_enabled:
-                    if hasattr(self, 'slack_enabled') and self.slack_enabled:
-                        self.send_slack_alert(attack['ips'][0], 0, True, attack)
-                    
-                    if hasattr(self, 'email_enabled') and self.email_enabled:
-                        self.send_email_alert(attack['ips'][0], 0, attack['username'], True, attack)
+                ip_info.update((detail['ip'], (detail['hostname'], detail['location'])) for detail in attack['ip_details'])
+        
+        # Block offending IPs and every IP involved in a distributed attack in one batch
+        self.block_ips(offender_ips + [ip for attack in distributed_attacks for ip in attack['ips']], ip_info=ip_info)
+        
+        for ip, recent_attempts in offenders:
+            # Get the usernames targeted
+            usernames = {username for _, username in recent_attempts if username}
+            username_str = ", ".join(usernames) if usernames else "Unknown"
+            
+            # Send alerts
+            if self.alerts_enabled:
+                if self.slack_enabled:
+                    self._dispatch_alert(self.send_slack_alert, ip, len(recent_attempts), ip_info=ip_info.get(ip))
+                
+                if self.email_enabled:
+                    self._dispatch_alert(self.send_email_alert, ip, len(recent_attempts), username_str, ip_info=ip_info.get(ip))
+        
+        for attack in distributed_attacks:
+            # Alert once per cluster, and again only when new IPs join it or its blocks were lifted
+            ips = frozenset(attack['ips'])
+            if ips <= self._last_reported.get(attack['username'], frozenset()):
+                continue
+            self._last_reported[attack['username']] = ips
+            
+            # Send alerts for distributed attacks
+            if self.alerts_enabled:
+                if self.slack_enabled:
+                    self._dispatch_alert(self.send_slack_alert, attack['ips'][0], 0, True, attack)
                 
-                # Block all IPs involved
-                for ip in attack['ips']:
-                    if ip not in self.blocked_ips and not self.is_whitelisted(ip):
-                        self.block_ip(ip)
+                if self.email_enabled:
+                    self._dispatch_alert(self.send_email_alert, attack['ips'][0], 0, attack['username'], True, attack)
     
     def monitor(self, interval=60):
         """Monitor SSH login attempts continuously."""
@@ -1135,12 +1968,28 @@ class AdvancedSSHDefender:
         if self.cidr_whitelist:
             logger.info(f"Whitelisted CIDR ranges: {', '.join(str(cidr) for cidr in self.cidr_whitelist)}")
         
+        # Turn SIGTERM into a normal exit so pending state is flushed below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
         try:
+            # Schedule cycles against a monotonic deadline so processing time doesn't push later cycles back
+            deadline = time.monotonic()
             while True:
                 self.process_attempts()
-                time.sleep(interval)
+                self.flush_state()
+                
+                deadline += interval
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Overran the interval; start the next cycle now instead of running missed ones back to back
+                    logger.warning(f"Monitoring cycle overran the {interval}s interval by {-delay:.1f}s")
+                    deadline = time.monotonic()
         except KeyboardInterrupt:
             logger.info("Monitoring stopped by user")
+        finally:
+            self.flush_state()
 
 def generate_sample_config():
     """Generate a sample configuration file."""
@@ -1296,11 +2145,11 @@ def main():
         logger.info("Testing alert configurations...")
         test_ip = "192.0.2.1"  # TEST-NET-1 IP for documentation
         
-        if hasattr(defender, 'slack_enabled') and defender.slack_enabled:
+        if defender.slack_enabled:
             defender.send_slack_alert(test_ip, 10)
             logger.info("Slack alert test sent.")
         
-        if hasattr(defender, 'email_enabled') and defender.email_enabled:
+        if defender.email_enabled:
             defender.send_email_alert(test_ip, 10, "admin")
             logger.info("Email alert test sent.")
         
@@ -1317,11 +2166,11 @@ def main():
                     ]
                 }
                 
-                if hasattr(defender, 'slack_enabled') and defender.slack_enabled:
+                if defender.slack_enabled:
                     defender.send_slack_alert(test_ip, 0, True, test_distributed)
                     logger.info("Distributed attack Slack alert test sent.")
                 
-                if hasattr(defender, 'email_enabled') and defender.email_enabled:
+                if defender.email_enabled:
                     defender.send_email_alert(test_ip, 0, 'admin', True, test_distributed)
                     logger.info("Distributed attack email alert test sent.")
         
@@ -1330,6 +2179,7 @@ def main():
     if args.once:
         # Process attempts once and exit
         defender.process_attempts()
+        defender.flush_state()
     else:
         # Continuously monitor
         defender.monitor(interval=args.interval)